@@ -0,0 +1,500 @@
+"""Microbenchmarks for the smart-queue hot paths.
+
+Runs on synthetic data only (no camera, no YOLO model) and compares each
+result against the stored baseline in benchmarks/baseline.json. The process
+exits with status 1 when any benchmark is slower than its baseline by more
+than the allowed threshold, so it can be used as a regression gate.
+
+Usage (a partir da raiz do projeto):
+    python benchmarks/bench_hot_paths.py                 # compara com o baseline
+    python benchmarks/bench_hot_paths.py --update        # grava/atualiza o baseline
+    python benchmarks/bench_hot_paths.py --only tracker  # filtra por nome
+    python benchmarks/bench_hot_paths.py --threshold 0.5
+
+Timings are per operation (microseconds), taking the best of several repeats
+to reduce noise. Baselines are machine specific: refresh them with --update
+on the reference machine after an intentional performance change.
+Benchmarks whose dependencies are missing (OpenCV/NumPy) are skipped.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+from counting import crossed_line  # noqa: E402
+from queue_metrics import QueueStats  # noqa: E402
+from tracker import SimpleTracker  # noqa: E402
+
+try:
+    import cv2  # noqa: F401
+    import numpy as np
+    import vision
+    from motion_gate import MotionGate, MotionGateConfig
+    from eta_engine import EtaEngineConfig, MonteCarloEta
+except ImportError:  # pragma: no cover - optional for the pure-Python benches
+    np = None  # type: ignore
+    vision = None  # type: ignore
+
+BASELINE_PATH = ROOT_DIR / "benchmarks" / "baseline.json"
+DEFAULT_THRESHOLD = 0.30
+SEED = 1234
+
+RESOLUTIONS = {
+    "720p": (720, 1280),
+    "1080p": (1080, 1920),
+    "4k": (2160, 3840),
+}
+
+
+@dataclass
+class Benchmark:
+    name: str
+    # setup() devolve (fn, ops): fn executa `ops` operações do hot path
+    setup: Callable[[], Tuple[Callable[[], None], int]]
+    requires_cv: bool = False
+
+
+# ============================================
+# SYNTHETIC DATA
+# ============================================
+
+def _crowd_frames(n_people: int, n_frames: int, width: int = 1920, height: int = 1080,
+                  seed: int = SEED) -> List[List[Tuple[int, int]]]:
+    """People walking left to right with jitter; some drop out/appear per frame."""
+    rnd = random.Random(seed)
+    people = [[rnd.uniform(0, width), rnd.uniform(0, height), rnd.uniform(2, 12)]
+              for _ in range(n_people)]
+    frames = []
+    for _ in range(n_frames):
+        centroids = []
+        for p in people:
+            p[0] = (p[0] + p[2]) % width
+            p[1] = min(height - 1, max(0, p[1] + rnd.uniform(-3, 3)))
+            if rnd.random() < 0.05:
+                continue  # detecção perdida neste frame
+            centroids.append((int(p[0]), int(p[1])))
+        rnd.shuffle(centroids)
+        frames.append(centroids)
+    return frames
+
+
+def _synthetic_detections(n: int, height: int, width: int, seed: int = SEED) -> List[Dict]:
+    rnd = random.Random(seed)
+    dets = []
+    for _ in range(n):
+        w = rnd.randint(width // 40, width // 12)
+        h = int(w * rnd.uniform(2.0, 3.0))
+        x1 = rnd.randint(0, max(1, width - w - 1))
+        y1 = rnd.randint(30, max(31, height - h - 1))
+        dets.append({'x1': x1, 'y1': y1, 'x2': x1 + w, 'y2': y1 + h,
+                     'confidence': rnd.uniform(0.5, 0.99)})
+    return dets
+
+
+class _FakeTensor:
+    """Mimics the bits of the torch.Tensor API used by detect_people."""
+
+    def __init__(self, data):
+        self._data = data
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._data
+
+    def __getitem__(self, idx):
+        return _FakeTensor(self._data[idx])
+
+    def __float__(self):
+        return float(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _FakeBoxes:
+    def __init__(self, xyxy, conf):
+        self.xyxy = _FakeTensor(xyxy)
+        self.conf = _FakeTensor(conf)
+        self.cls = _FakeTensor(np.zeros(len(conf), dtype=np.float32))
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield _FakeBoxes(self.xyxy.numpy()[i:i + 1], self.conf.numpy()[i:i + 1])
+
+
+class _FakeResult:
+    def __init__(self, boxes: _FakeBoxes):
+        self.boxes = boxes
+
+
+class _FakeTiledModel:
+    """Stub YOLO model for batched tiles: the same people seen from every tile."""
+
+    def __init__(self, n_people: int, tile_size: int):
+        dets = _synthetic_detections(n_people, tile_size, tile_size)
+        xyxy = np.array([[d['x1'], d['y1'], d['x2'], d['y2']] for d in dets], dtype=np.float32)
+        conf = np.array([d['confidence'] for d in dets], dtype=np.float32)
+        self._result = _FakeResult(_FakeBoxes(xyxy, conf))
+
+    def __call__(self, crops, **kwargs):
+        return [self._result] * len(crops)
+
+
+class _FakeModel:
+    """Stub YOLO model: returns a precomputed result for any frame."""
+
+    def __init__(self, n_people: int, height: int, width: int):
+        dets = _synthetic_detections(n_people, height, width)
+        xyxy = np.array([[d['x1'], d['y1'], d['x2'], d['y2']] for d in dets], dtype=np.float32)
+        conf = np.array([d['confidence'] for d in dets], dtype=np.float32)
+        self._results = [_FakeResult(_FakeBoxes(xyxy, conf))]
+
+    def __call__(self, frame, **kwargs):
+        return self._results
+
+
+# ============================================
+# BENCHMARKS
+# ============================================
+
+def _bench_tracker(n_people: int):
+    def setup():
+        frames = _crowd_frames(n_people, n_frames=60)
+
+        def run():
+            tracker = SimpleTracker(match_radius_px=60, ttl=6)
+            for centroids in frames:
+                tracker.update(centroids)
+        return run, len(frames)
+    return setup
+
+
+def _bench_on_entry():
+    def setup():
+        n = 5000
+
+        def run():
+            stats = QueueStats(window_sec=120)
+            ts = 1_000_000.0
+            for _ in range(n):
+                ts += 0.05  # 20 entradas/s -> janela sempre cheia
+                stats.on_entry(ts)
+        return run, n
+    return setup
+
+
+def _bench_tick():
+    def setup():
+        n = 5000
+        stats = QueueStats(window_sec=120)
+
+        def run():
+            stats.queue_estimate = 10_000
+            stats._service_accum = 0.0
+            for _ in range(n):
+                stats.tick(0.033, 20.0)
+        return run, n
+    return setup
+
+
+def _bench_build_metrics():
+    def setup():
+        n = 2000
+        stats = QueueStats(window_sec=120)
+        base = 1_000_000.0
+        for i in range(2400):
+            stats.on_entry(base + i * 0.05)
+        now = base + 2400 * 0.05
+
+        def run():
+            for _ in range(n):
+                stats.build_metrics(
+                    fps=24.7,
+                    entries=2400,
+                    direction='left_to_right',
+                    people_detected=12,
+                    avg_service_time_sec=20.0,
+                    led_alert=True,
+                    now=now,
+                )
+        return run, n
+    return setup
+
+
+def _bench_hub_poll_idle():
+    def setup():
+        from metrics_sinks import MetricsHub, StdoutSink, SinkConfig
+        n = 5000
+        stats = QueueStats(window_sec=120)
+        sink = StdoutSink(SinkConfig(interval_sec=3600))
+        sink._next_due = float("inf")  # nunca devido: mede só o custo por frame
+        hub = MetricsHub(
+            lambda now: stats.build_metrics(24.7, 10, 'left_to_right', 3, 20.0, now=now),
+            [sink],
+        )
+
+        def run():
+            for _ in range(n):
+                hub.poll(1_000_000.0)
+        return run, n
+    return setup
+
+
+def _bench_crossed_line():
+    def setup():
+        rnd = random.Random(SEED)
+        a, b = (960, 0), (960, 1080)
+        pairs = []
+        for _ in range(10_000):
+            x = rnd.randint(860, 1060)
+            y = rnd.randint(0, 1079)
+            pairs.append(((x, y), (x + rnd.randint(-15, 15), y + rnd.randint(-5, 5))))
+
+        def run():
+            for prev_c, curr_c in pairs:
+                crossed_line(prev_c, curr_c, a, b)
+        return run, len(pairs)
+    return setup
+
+
+def _bench_draw_detections(res: str, n_people: int = 25):
+    def setup():
+        h, w = RESOLUTIONS[res]
+        frame = np.zeros((h, w, 3), dtype=np.uint8)
+        dets = _synthetic_detections(n_people, h, w)
+
+        def run():
+            vision.draw_detections(frame, dets)
+        return run, 1
+    return setup
+
+
+def _bench_draw_info(res: str, show_metrics: bool):
+    def setup():
+        h, w = RESOLUTIONS[res]
+        frame = np.zeros((h, w, 3), dtype=np.uint8)
+        stats = QueueStats()
+        metrics = stats.build_metrics(24.7, 120, 'left_to_right', 12, 20.0, now=1_000_000.0)
+
+        def run():
+            vision.draw_info(frame, 24.7, 12, 120, 'left_to_right', 100, 8, 160,
+                             debug=True, show_eta=True, show_metrics=show_metrics,
+                             metrics=metrics)
+        return run, 1
+    return setup
+
+
+def _bench_detect_people(n_people: int):
+    def setup():
+        h, w = RESOLUTIONS["1080p"]
+        model = _FakeModel(n_people, h, w)
+        frame = np.zeros((8, 8, 3), dtype=np.uint8)  # o stub ignora o frame
+
+        def run():
+            vision.detect_people(model, frame, 0.5)
+        return run, 1
+    return setup
+
+
+def _bench_tiled_merge(res: str, n_people: int = 8):
+    def setup():
+        h, w = RESOLUTIONS[res]
+        frame = np.zeros((h, w, 3), dtype=np.uint8)
+        detector = vision.TiledDetector(vision.TilingConfig(enabled=True))
+        model = _FakeTiledModel(n_people, detector.cfg.tile_size)
+
+        def run():
+            detector.detect(model, frame, 0.5)
+        return run, 1
+    return setup
+
+
+def _bench_motion_gate(res: str, region: str):
+    def setup():
+        h, w = RESOLUTIONS[res]
+        rng = np.random.default_rng(SEED)
+        frames = [rng.integers(0, 255, (h, w, 3), dtype=np.uint8) for _ in range(2)]
+        gate = MotionGate(MotionGateConfig(enabled=True, region=region))
+        x_mid = w // 2
+        rect = (x_mid - 150, 0, x_mid + 150, h) if region == 'band' else None
+        state = {"i": 0, "now": 0.0}
+
+        def run():
+            state["i"] ^= 1
+            state["now"] += 0.1
+            gate.check(frames[state["i"]], state["now"], rect)
+        return run, 1
+    return setup
+
+
+def _bench_eta_mc(queue_len: int, cached: bool):
+    def setup():
+        rng = random.Random(SEED)
+        durations = [rng.uniform(8.0, 40.0) for _ in range(20)]
+        engine = MonteCarloEta(EtaEngineConfig(enabled=True, seed=SEED))
+
+        def run():
+            if not cached:
+                engine._key = None  # força nova simulação
+            engine.percentiles(queue_len, durations, 1, 20.0, 3.0)
+        return run, 1
+    return setup
+
+
+def build_benchmarks() -> List[Benchmark]:
+    benches: List[Benchmark] = []
+    for n in (5, 20, 50, 100):
+        benches.append(Benchmark(f"tracker.update[{n}p]", _bench_tracker(n)))
+    benches.append(Benchmark("queue_stats.on_entry", _bench_on_entry()))
+    benches.append(Benchmark("queue_stats.tick", _bench_tick()))
+    benches.append(Benchmark("queue_stats.build_metrics", _bench_build_metrics()))
+    benches.append(Benchmark("metrics_hub.poll[idle]", _bench_hub_poll_idle()))
+    benches.append(Benchmark("counting.crossed_line", _bench_crossed_line()))
+    for res in RESOLUTIONS:
+        benches.append(Benchmark(f"vision.draw_detections[{res}]", _bench_draw_detections(res),
+                                 requires_cv=True))
+        benches.append(Benchmark(f"vision.draw_info[{res}]", _bench_draw_info(res, False),
+                                 requires_cv=True))
+        benches.append(Benchmark(f"vision.draw_info_metrics[{res}]", _bench_draw_info(res, True),
+                                 requires_cv=True))
+    for n in (5, 50):
+        benches.append(Benchmark(f"vision.detect_people_post[{n}p]", _bench_detect_people(n),
+                                 requires_cv=True))
+    for res in ("1080p", "4k"):
+        benches.append(Benchmark(f"vision.tiled_merge[{res}]", _bench_tiled_merge(res),
+                                 requires_cv=True))
+    for res in ("1080p", "4k"):
+        for region in ("band", "full"):
+            benches.append(Benchmark(f"motion_gate.check[{res},{region}]",
+                                     _bench_motion_gate(res, region), requires_cv=True))
+    for q in (5, 50):
+        benches.append(Benchmark(f"eta_mc.simulate[q{q}]", _bench_eta_mc(q, cached=False),
+                                 requires_cv=True))
+    benches.append(Benchmark("eta_mc.cached", _bench_eta_mc(50, cached=True), requires_cv=True))
+    return benches
+
+
+# ============================================
+# RUNNER
+# ============================================
+
+def measure(bench: Benchmark, repeats: int, min_time_sec: float) -> float:
+    """Best per-operation time in microseconds over `repeats` runs."""
+    fn, ops = bench.setup()
+    fn()  # aquecimento
+    # Calibrar o nº de chamadas para cada repetição durar pelo menos min_time_sec
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time_sec or loops >= 1_000_000:
+            break
+        loops *= 2
+    best = elapsed
+    for _ in range(max(0, repeats - 1)):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, time.perf_counter() - t0)
+    return best / (loops * ops) * 1e6
+
+
+def _machine_info() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "processor": platform.processor() or "",
+    }
+
+
+def load_baseline(path: Path) -> Dict:
+    if not path.exists():
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_baseline(path: Path, results: Dict[str, float], previous: Dict):
+    merged = dict(previous.get("results_us", {}))
+    merged.update({k: round(v, 4) for k, v in results.items()})
+    data = {
+        "machine": _machine_info(),
+        "results_us": dict(sorted(merged.items())),
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Smart Queue hot-path microbenchmarks")
+    parser.add_argument("--update", action="store_true", help="gravar resultados como novo baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="regressão máxima tolerada (0.30 = 30%% mais lento)")
+    parser.add_argument("--only", default="", help="correr apenas benchmarks cujo nome contém este texto")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.05,
+                        help="duração mínima (s) de cada repetição")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    base_results = baseline.get("results_us", {})
+    if baseline and baseline.get("machine") != _machine_info():
+        print("⚠️  Baseline gravado noutra máquina/versão de Python; comparação pode não ser fiável.")
+
+    results: Dict[str, float] = {}
+    regressions: List[str] = []
+    print(f"{'benchmark':42s} {'us/op':>12s} {'baseline':>12s} {'delta':>8s}")
+    for bench in build_benchmarks():
+        if args.only and args.only not in bench.name:
+            continue
+        if bench.requires_cv and vision is None:
+            print(f"{bench.name:42s} {'SKIP':>12s}   (OpenCV/NumPy indisponível)")
+            continue
+        us = measure(bench, args.repeats, args.min_time)
+        results[bench.name] = us
+        ref = base_results.get(bench.name)
+        if ref:
+            delta = (us - ref) / ref
+            flag = ""
+            if delta > args.threshold:
+                flag = "  REGRESSÃO"
+                regressions.append(bench.name)
+            print(f"{bench.name:42s} {us:12.3f} {ref:12.3f} {delta:+8.1%}{flag}")
+        else:
+            print(f"{bench.name:42s} {us:12.3f} {'-':>12s} {'new':>8s}")
+
+    if args.update:
+        save_baseline(args.baseline, results, baseline)
+        print(f"💾 Baseline atualizado em {args.baseline}")
+        return 0
+    if regressions:
+        print(f"❌ {len(regressions)} benchmark(s) acima do limite de {args.threshold:.0%}: "
+              + ", ".join(regressions))
+        return 1
+    print("✅ Sem regressões")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""asyncio runtime for the Smart Queue main loop.
+
+Alternative to the per-frame polling loop in main.py (``runtime.mode: async``):
+capture and YOLO inference run in executors, while the side channels are
+independent tasks driven by events or their own clocks instead of the frame
+rate:
+
+- button presses are pushed from the serial thread into an asyncio.Queue;
+- the LED is only written when the alert state actually changes;
+- metrics snapshots are fanned out to the sinks when one is due
+  (each sink uploads/writes from its own thread);
+- the queue model is drained on a fixed tick;
+- an optional local HTTP endpoint serves /metrics and /health,
+  /profile?frames=N arms the on-demand profiler and /site returns the
+  federated site view (aggregator role);
+- config.yaml is watched for changes and handed to ``on_config_change``
+  (the hot reloader) when it is modified.
+
+The OpenCV window (imshow/waitKey) stays on the event-loop thread, which is
+the main thread.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from urllib.parse import parse_qs, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional, TYPE_CHECKING
+
+import cv2
+
+if TYPE_CHECKING:  # pragma: no cover
+    from button_listener import ButtonListener
+    from metrics_sinks import MetricsHub
+    from pipeline import QueuePipeline
+
+
+@dataclass
+class RuntimeConfig:
+    mode: str = "sync"               # 'sync' (loop clássico) ou 'async'
+    tick_interval_sec: float = 0.5   # cadência do modelo de fila simulado
+    http_host: str = "127.0.0.1"
+    http_port: int = 0               # 0 = endpoint HTTP desativado
+    config_poll_sec: float = 2.0     # 0 = não vigiar config.yaml
+
+
+class AsyncRuntime:
+    def __init__(
+        self,
+        pipeline: "QueuePipeline",
+        cap,
+        window_name: str,
+        cfg: RuntimeConfig,
+        metrics_hub: Optional["MetricsHub"] = None,
+        config_path: Optional[Path] = None,
+        on_config_change: Optional[Callable[[Path], None]] = None,
+    ):
+        self.pipeline = pipeline
+        self.cap = cap
+        self.window_name = window_name
+        self.cfg = cfg
+        self.metrics_hub = metrics_hub
+        self.button_listener: Optional["ButtonListener"] = None
+        self.config_path = config_path
+        self.on_config_change = on_config_change
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._button_events: Optional[asyncio.Queue] = None
+        self._status_changed: Optional[asyncio.Event] = None
+        self._last_alert = False
+        # executores dedicados: a captura do frame seguinte sobrepõe-se à inferência
+        self._capture_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="capture")
+        self._infer_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="infer")
+
+    # ------------------------------------------------------------------
+    # Entrada thread-safe (chamada pela thread do ButtonListener)
+    # ------------------------------------------------------------------
+    def submit_service_event(self, ts: float):
+        loop, queue = self._loop, self._button_events
+        if loop is None or queue is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(queue.put_nowait, ts)
+
+    def run(self):
+        try:
+            asyncio.run(self._main())
+        finally:
+            self._capture_pool.shutdown(wait=True)
+            self._infer_pool.shutdown(wait=True)
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._button_events = asyncio.Queue()
+        self._status_changed = asyncio.Event()
+
+        side_tasks = [
+            asyncio.create_task(self._clock_task(), name="queue-clock"),
+            asyncio.create_task(self._button_task(), name="button"),
+        ]
+        if self.button_listener is not None:
+            side_tasks.append(asyncio.create_task(self._led_task(), name="led"))
+        if self.metrics_hub is not None:
+            side_tasks.append(asyncio.create_task(self._sinks_task(), name="metrics-sinks"))
+        if self.cfg.http_port:
+            side_tasks.append(asyncio.create_task(self._http_task(), name="http"))
+        if self.config_path is not None and self.cfg.config_poll_sec > 0:
+            side_tasks.append(asyncio.create_task(self._config_watch_task(), name="config-watch"))
+
+        try:
+            await self._frame_loop()
+        finally:
+            for task in side_tasks:
+                task.cancel()
+            await asyncio.gather(*side_tasks, return_exceptions=True)
+
+    # ------------------------------------------------------------------
+    # Frames
+    # ------------------------------------------------------------------
+    async def _frame_loop(self):
+        loop = asyncio.get_running_loop()
+        p = self.pipeline
+        pending = loop.run_in_executor(self._capture_pool, self.cap.read)
+        try:
+            while True:
+                ret, frame = await pending
+                if not ret:
+                    print("❌ Erro ao ler frame")
+                    break
+                # pedir já o frame seguinte enquanto este é processado
+                pending = loop.run_in_executor(self._capture_pool, self.cap.read)
+
+                if p.profiler is not None:
+                    p.profiler.on_frame()
+
+                now = time.time()
+                p.ensure_line(frame)
+                p.count_frame(now)
+
+                if p.should_infer(frame, now):
+                    try:
+                        detections = await loop.run_in_executor(self._infer_pool, p.infer, frame)
+                        p.apply_detections(detections, time.time())
+                    except Exception as e:
+                        print(f"⚠️  Erro na detecção: {e}")
+                        p.last_detections = []
+                    self._notify_status()
+
+                if p.update_alert(now) != self._last_alert:
+                    self._last_alert = p.led_alert
+                    self._notify_status()
+
+                metrics = p.build_metrics(now) if p.display.show_metrics else None
+                frame = p.render(frame, metrics)
+                p.record(frame, now)
+                cv2.imshow(self.window_name, frame)
+
+                key = cv2.waitKey(1) & 0xFF
+                if not p.handle_key(chr(key).lower()):
+                    break
+        finally:
+            # não libertar a câmara com uma leitura ainda em curso
+            if not pending.done():
+                await asyncio.gather(pending, return_exceptions=True)
+
+    # ------------------------------------------------------------------
+    # Canais laterais
+    # ------------------------------------------------------------------
+    def _notify_status(self):
+        if self._status_changed is not None:
+            self._status_changed.set()
+
+    async def _clock_task(self):
+        interval = max(0.05, self.cfg.tick_interval_sec)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.time()
+            self.pipeline.advance_clock(now)
+            self.pipeline.publish_federation(now)
+            self._notify_status()
+
+    async def _button_task(self):
+        assert self._button_events is not None
+        while True:
+            ts = await self._button_events.get()
+            batch = [ts]
+            while not self._button_events.empty():
+                batch.append(self._button_events.get_nowait())
+            self.pipeline.register_service_events(batch)
+            self._notify_status()
+
+    async def _led_task(self):
+        assert self._status_changed is not None
+        listener = self.button_listener
+        led_state: Optional[bool] = None
+        while True:
+            await self._status_changed.wait()
+            self._status_changed.clear()
+            _, _, led_should_be_on = self.pipeline.queue_status()
+            if led_should_be_on != led_state and listener is not None:
+                # escrita série fora do event loop
+                await asyncio.to_thread(listener.set_led, led_should_be_on)
+                led_state = led_should_be_on
+
+    async def _sinks_task(self):
+        assert self.metrics_hub is not None
+        hub = self.metrics_hub
+        while True:
+            delay = hub.next_due() - time.time()
+            await asyncio.sleep(min(1.0, max(0.05, delay)))
+            # poll() só enfileira: o envio/escrita acontece na thread de cada sink
+            hub.poll(time.time())
+
+    async def _config_watch_task(self):
+        assert self.config_path is not None
+        path = self.config_path
+        last_mtime = await asyncio.to_thread(_mtime, path)
+        while True:
+            await asyncio.sleep(self.cfg.config_poll_sec)
+            mtime = await asyncio.to_thread(_mtime, path)
+            if mtime is None or mtime == last_mtime:
+                continue
+            last_mtime = mtime
+            if self.on_config_change is not None:
+                self.on_config_change(path)
+            else:
+                print(f"ℹ️  {path.name} alterado; reinicia o programa para aplicar.")
+
+    # ------------------------------------------------------------------
+    # HTTP local (/metrics, /health, /profile, /site)
+    # ------------------------------------------------------------------
+    async def _http_task(self):
+        server = await asyncio.start_server(self._handle_http, self.cfg.http_host, self.cfg.http_port)
+        print(f"🌐 HTTP local em http://{self.cfg.http_host}:{self.cfg.http_port}/metrics")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+            # descartar cabeçalhos
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+            parts = request_line.decode("latin-1").split()
+            path = parts[1] if len(parts) >= 2 else "/"
+            status, body = self._route(parts[0] if parts else "", path)
+            payload = json.dumps(body, separators=(",", ":")).encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1")
+                + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _route(self, method: str, target: str):
+        if method != "GET":
+            return "405 Method Not Allowed", {"error": "method not allowed"}
+        url = urlsplit(target)
+        path = url.path
+        if path == "/profile":
+            profiler = self.pipeline.profiler
+            if profiler is None:
+                return "404 Not Found", {"error": "profiler disabled"}
+            frames = parse_qs(url.query).get("frames", [None])[0]
+            try:
+                profiler.request(int(frames) if frames else None)
+            except ValueError:
+                return "400 Bad Request", {"error": "invalid frames"}
+            return "202 Accepted", {"ok": True, "mode": profiler.cfg.mode}
+        if path == "/site":
+            if self.pipeline.site is None:
+                return "404 Not Found", {"error": "federation aggregator disabled"}
+            return "200 OK", self.pipeline.site.site_state()
+        if path == "/metrics":
+            return "200 OK", self.pipeline.build_metrics()
+        if path == "/health":
+            p = self.pipeline
+            return "200 OK", {"ok": True, "frames": p.total_frames, "fps": round(p.fps, 2)}
+        return "404 Not Found", {"error": "not found"}
+
+
+def _mtime(path: Path) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
@@ -61,7 +61,8 @@ class ButtonListener:
             )
         except SerialException as exc:
             raise RuntimeError(f"Não foi possível abrir {self.cfg.port}: {exc}") from exc
-        self._thread = threading.Thread(target=self._run, daemon=True)
+        # cada thread fica com o seu evento de paragem (restart() cria um novo)
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), daemon=True)
         self._thread.start()
 
     def stop(self):
@@ -76,6 +77,18 @@ class ButtonListener:
             except SerialException:
                 pass
 
+    def restart(self):
+        """Fecha a porta e volta a abri-la com a configuração atual (porta/baudrate)."""
+        self.stop()
+        if self._thread is not None and self._thread.is_alive():
+            # leitura presa na porta antiga: uma segunda thread contaria os toques a dobrar
+            raise RuntimeError("a leitura da porta anterior não terminou; reinicie o programa")
+        self._serial = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._led_state = False
+        self.start()
+
     def set_led(self, state: bool):
         """Envia comando para ligar (True) ou desligar (False) o LED vermelho."""
         if not self._serial or not self._serial.is_open:
@@ -90,9 +103,9 @@ class ButtonListener:
         except SerialException:
             pass  # Ignorar erros de comunicação
 
-    def _run(self):  # pragma: no cover - relies on hardware
+    def _run(self, stop: threading.Event):  # pragma: no cover - relies on hardware
         assert self._serial is not None
-        while not self._stop.is_set():
+        while not stop.is_set():
             try:
                 raw = self._serial.readline()
             except SerialException:
@@ -0,0 +1,166 @@
+"""Density-aware two-model cascade (fast model first, accurate model on demand).
+
+Every inference runs the fast model (``yolo_model``, optionally tiled). Its
+output decides whether the frame is hard enough to escalate to the accurate
+model (``cascade.accurate_model``):
+
+- crowd: at least ``crowd_people`` detections in the counting band;
+- low confidence: a share of the band detections falls in the uncertain range
+  ``[probe_confidence, low_confidence)`` (the fast model is queried at
+  ``probe_confidence`` so near-misses are visible, and only detections above
+  the normal threshold are kept);
+- track loss: tracks disappeared inside the band on the previous update,
+  reported by the pipeline through ``report_track_loss()``.
+
+Once escalated the cascade stays up for ``hold_sec`` after the last trigger
+and then steps back down. The accurate model runs on the counting band only
+(``region: band``, its boxes replace the fast ones inside the band; a person
+straddling the band edge is merged with the fast box outside instead of being
+counted twice) or on the whole frame. Both models stay loaded for the whole
+session.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from vision import detect_people, merge_detections, touches_inner_border
+
+Rect = Tuple[int, int, int, int]  # x1, y1, x2, y2
+
+# junção das deteções do modelo preciso (banda) com as do rápido (fora da banda)
+MERGE_IOU = 0.5
+MERGE_IOS = 0.8
+
+
+@dataclass
+class CascadeConfig:
+    enabled: bool = False
+    accurate_model: str = 'models/yolov8s.pt'
+    region: str = 'band'              # 'band' (só a banda de contagem) ou 'full'
+    crowd_people: int = 6             # nº de pessoas na banda que ativa o modelo preciso
+    probe_confidence: float = 0.25    # confiança usada no modelo rápido para ver "quase deteções"
+    low_confidence: float = 0.6       # deteções abaixo disto contam como incertas
+    low_conf_ratio: float = 0.3       # fração de deteções incertas na banda que ativa o modelo preciso
+    track_loss: int = 1               # tracks perdidos na banda que ativam o modelo preciso
+    hold_sec: float = 3.0             # mantém o modelo preciso após o último gatilho
+    stats_window: int = 200           # nº de inferências recentes para a taxa de escalonamento
+
+
+class ModelCascade:
+    def __init__(self, cfg: CascadeConfig, accurate_model):
+        self.cfg = cfg
+        self.accurate_model = accurate_model
+        self.escalations = 0
+        self.triggers: Dict[str, int] = {'crowd': 0, 'low_conf': 0, 'track_loss': 0}
+        self.last_reason: Optional[str] = None
+        self._escalated_until = float('-inf')
+        self._pending_track_loss = 0  # escrito pelo loop, lido na thread de inferência
+        self._recent: Deque[int] = deque(maxlen=max(1, int(cfg.stats_window)))
+        self._recent_escalated = 0
+
+    def escalated(self, now: float) -> bool:
+        return now < self._escalated_until
+
+    def report_track_loss(self, lost_in_band: int, now: float):
+        """Chamado após cada update do tracker com os tracks perdidos na banda."""
+        if lost_in_band >= max(1, self.cfg.track_loss):
+            self._pending_track_loss += lost_in_band
+
+    def detect(self, fast_detect, frame, conf: float, now: float,
+               band: Optional[Rect]) -> List[Dict[str, Any]]:
+        """
+        fast_detect(frame, conf) corre o modelo rápido (inteiro ou em tiles).
+        Devolve as deteções finais acima de ``conf``.
+        """
+        probe = min(conf, self.cfg.probe_confidence)
+        candidates = fast_detect(frame, probe)
+        detections = [d for d in candidates if d['confidence'] >= conf]
+
+        reason = self._trigger(candidates, conf, band)
+        if reason is not None:
+            self.triggers[reason] += 1
+            self.last_reason = reason
+            self._escalated_until = now + self.cfg.hold_sec
+        escalate = self.escalated(now)
+        self._record(escalate)
+        if not escalate:
+            return detections
+
+        self.escalations += 1
+        if self.cfg.region != 'band' or band is None:
+            return detect_people(self.accurate_model, frame, conf)
+        x1, y1, x2, y2 = band
+        refined = detect_people(self.accurate_model, frame[y1:y2, x1:x2], conf)
+        for d in refined:
+            d['x1'] += x1
+            d['x2'] += x1
+            d['y1'] += y1
+            d['y2'] += y1
+        # fora da banda ficam as deteções do modelo rápido
+        outside = [d for d in detections if not _centroid_in(d, band)]
+        if not outside or not refined:
+            return outside + refined
+        h, w = frame.shape[:2]
+        return _merge_band(outside, refined, band, (0, 0, w, h))
+
+    def _trigger(self, candidates: List[Dict[str, Any]], conf: float,
+                 band: Optional[Rect]) -> Optional[str]:
+        lost = self._pending_track_loss
+        self._pending_track_loss = 0
+        in_band = candidates if band is None else [d for d in candidates if _centroid_in(d, band)]
+        confident = [d for d in in_band if d['confidence'] >= conf]
+        if len(confident) >= self.cfg.crowd_people:
+            return 'crowd'
+        if in_band:
+            uncertain = sum(1 for d in in_band if d['confidence'] < self.cfg.low_confidence)
+            if uncertain / len(in_band) >= self.cfg.low_conf_ratio:
+                return 'low_conf'
+        if lost:
+            return 'track_loss'
+        return None
+
+    def _record(self, escalated: bool):
+        if len(self._recent) == self._recent.maxlen:
+            self._recent_escalated -= self._recent[0]
+        value = 1 if escalated else 0
+        self._recent.append(value)
+        self._recent_escalated += value
+
+    def metrics(self, now: float) -> Dict:
+        n = len(self._recent)
+        return {
+            "cascade_escalated": int(self.escalated(now)),
+            "cascade_escalation_rate": round(self._recent_escalated / n, 3) if n else 0.0,
+            "cascade_escalations": self.escalations,
+            "cascade_trigger_crowd": self.triggers['crowd'],
+            "cascade_trigger_low_conf": self.triggers['low_conf'],
+            "cascade_trigger_track_loss": self.triggers['track_loss'],
+        }
+
+
+def _merge_band(outside: List[Dict[str, Any]], refined: List[Dict[str, Any]],
+                band: Rect, frame_rect: Rect) -> List[Dict[str, Any]]:
+    """Junta as duas listas sem duplicar quem está cortado no limite da banda."""
+    dets = outside + refined
+    boxes = np.array([[d['x1'], d['y1'], d['x2'], d['y2']] for d in dets], dtype=np.float32)
+    scores = np.array([d['confidence'] for d in dets], dtype=np.float32)
+    sources = np.array([0] * len(outside) + [1] * len(refined), dtype=np.int32)
+    cut = np.zeros(len(dets), dtype=bool)
+    cut[len(outside):] = touches_inner_border(boxes[len(outside):], band, frame_rect)
+    merged, merged_scores = merge_detections(boxes, scores, MERGE_IOU, MERGE_IOS,
+                                             sources=sources, cut=cut)
+    return [
+        {'x1': int(b[0]), 'y1': int(b[1]), 'x2': int(b[2]), 'y2': int(b[3]), 'confidence': float(s)}
+        for b, s in zip(merged, merged_scores)
+    ]
+
+
+def _centroid_in(det: Dict[str, Any], rect: Rect) -> bool:
+    cx = (det['x1'] + det['x2']) // 2
+    cy = (det['y1'] + det['y2']) // 2
+    return rect[0] <= cx < rect[2] and rect[1] <= cy < rect[3]
@@ -0,0 +1,309 @@
+"""Background event-clip recorder with an in-memory pre-roll buffer.
+
+The frame loop only calls submit() (rate-limited, optional downscale) and
+trigger(); both return immediately. A daemon thread JPEG-compresses frames
+into a ring buffer holding the last ``pre_roll_sec`` seconds, and when a
+trigger fires it collects pre-roll + post-roll frames into a clip that a
+second thread writes to disk with cv2.VideoWriter.
+
+Triggers during a clip extend its post-roll up to ``max_clip_sec``; past
+that the clip is closed and the pending event starts a new clip with its own
+pre-roll, so a steady stream of entries still yields bounded clips.
+
+Memory is hard-capped by ``max_buffer_mb``: a quarter is reserved for raw
+frames waiting to be encoded, the rest for the ring and clips waiting to be
+written. The oldest pre-roll frames are evicted first, and frames or clips
+that still do not fit are dropped. Nothing here ever blocks the video loop.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from queue import Empty, Full, Queue
+from typing import Deque, List, Optional
+
+import cv2
+import numpy as np
+
+
+@dataclass
+class ClipRecorderConfig:
+    enabled: bool = False
+    triggers: List[str] = field(default_factory=lambda: ['entry', 'led'])
+    pre_roll_sec: float = 5.0
+    post_roll_sec: float = 5.0
+    fps: float = 10.0              # frames guardados por segundo (não o FPS da câmara)
+    scale: float = 0.5             # redução antes de comprimir (1.0 = tamanho original)
+    jpeg_quality: int = 70
+    max_buffer_mb: float = 64.0    # limite duro de memória (ring + clips pendentes)
+    output_dir: Path = Path('data/clips')
+    codec: str = 'mp4v'
+    max_pending_clips: int = 4
+    max_clip_sec: float = 30.0     # duração máxima de um clip (depois abre outro)
+
+
+class _Frame:
+    """Frame JPEG partilhado entre o ring e os clips (contagem de referências)."""
+    __slots__ = ('ts', 'data', 'refs')
+
+    def __init__(self, ts: float, data: bytes):
+        self.ts = ts
+        self.data = data
+        self.refs = 0
+
+
+class _Clip:
+    __slots__ = ('reason', 'trigger_ts', 'end_ts', 'frames')
+
+    def __init__(self, reason: str, trigger_ts: float, end_ts: float):
+        self.reason = reason
+        self.trigger_ts = trigger_ts
+        self.end_ts = end_ts
+        self.frames: List[_Frame] = []
+
+
+class ClipRecorder:
+    def __init__(self, cfg: ClipRecorderConfig):
+        self.cfg = cfg
+        self.max_bytes = int(cfg.max_buffer_mb * 1024 * 1024)
+        # frames em bruto à espera do encoder contam para o limite (1/4 reservado)
+        self._inbox_max = self.max_bytes // 4
+        self._store_max = self.max_bytes - self._inbox_max
+        self.dropped_frames = 0
+        self.dropped_clips = 0
+        self.clips_written = 0
+        self._interval = 1.0 / max(0.1, cfg.fps)
+        self._last_submit = 0.0
+        # entrada (frame loop -> encoder): frames e triggers, pela mesma ordem
+        self._inbox: Queue = Queue(maxsize=max(2, int(cfg.fps)))
+        self._inbox_bytes = 0
+        self._oversize_warned = False
+        self._ring: Deque[_Frame] = deque()
+        self._held_bytes = 0  # bytes únicos no ring + clips ativos/pendentes
+        self._active: Optional[_Clip] = None
+        self._next: Optional[_Clip] = None  # evento que já não cabe no clip ativo
+        self._write_queue: Queue = Queue(maxsize=max(1, cfg.max_pending_clips))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._encoder = threading.Thread(target=self._encode_loop, name="clip-encoder", daemon=True)
+        self._writer = threading.Thread(target=self._write_loop, name="clip-writer", daemon=True)
+
+    def start(self):
+        self._encoder.start()
+        self._writer.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._encoder.join(timeout=timeout)
+        self._writer.join(timeout=timeout)
+
+    def buffered_bytes(self) -> int:
+        with self._lock:
+            return self._held_bytes + self._inbox_bytes
+
+    # ------------------------------------------------------------------
+    # Lado do frame loop
+    # ------------------------------------------------------------------
+    def wants(self, reason: str) -> bool:
+        return reason in self.cfg.triggers
+
+    def submit(self, frame, now: float):
+        if now - self._last_submit < self._interval:
+            return
+        self._last_submit = now
+        scale = self.cfg.scale
+        if 0 < scale < 1.0:
+            small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            small = frame.copy()  # o frame vai continuar a ser desenhado/reutilizado
+        with self._lock:
+            if self._inbox_bytes + small.nbytes > self._inbox_max:
+                self.dropped_frames += 1
+                if small.nbytes > self._inbox_max and not self._oversize_warned:
+                    self._oversize_warned = True
+                    print("⚠️  Clips: frame maior que o buffer de entrada (aumente max_buffer_mb ou reduza scale)")
+                return
+            self._inbox_bytes += small.nbytes
+        self._put(('frame', now, small))
+
+    def trigger(self, reason: str, now: Optional[float] = None):
+        if not self.wants(reason):
+            return
+        self._put(('trigger', time.time() if now is None else now, reason))
+
+    def _put(self, item):
+        try:
+            self._inbox.put_nowait(item)
+        except Full:
+            if item[0] == 'frame':
+                self._unqueue(item)
+                self.dropped_frames += 1
+                return
+            # trigger nunca se perde: descarta o frame mais antigo na fila
+            try:
+                self._unqueue(self._inbox.get_nowait())
+                self.dropped_frames += 1
+                self._inbox.put_nowait(item)
+            except (Empty, Full):
+                pass
+
+    def _unqueue(self, item):
+        """Desconta um item que saiu (ou não chegou a entrar) da fila de entrada."""
+        if item[0] == 'frame':
+            with self._lock:
+                self._inbox_bytes -= item[2].nbytes
+
+    # ------------------------------------------------------------------
+    # Encoder (ring buffer + clips)
+    # ------------------------------------------------------------------
+    def _encode_loop(self):
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), int(self.cfg.jpeg_quality)]
+        while not (self._stop.is_set() and self._inbox.empty()):
+            try:
+                item = self._inbox.get(timeout=0.25)
+            except Empty:
+                self._maybe_finish_clip(time.time())
+                continue
+            self._unqueue(item)
+            kind, ts, payload = item
+            if kind == 'trigger':
+                self._on_trigger(payload, ts)
+                continue
+            ok, buf = cv2.imencode('.jpg', payload, params)
+            if not ok:
+                self.dropped_frames += 1
+                continue
+            self._add_frame(_Frame(ts, buf.tobytes()))
+            self._maybe_finish_clip(ts)
+        # a sair: fechar o clip em curso com o que houver
+        self._maybe_finish_clip(float('inf'))
+
+    def _acquire(self, frame: _Frame):
+        # chamado com self._lock
+        if frame.refs == 0:
+            self._held_bytes += len(frame.data)
+        frame.refs += 1
+
+    def _release_frame(self, frame: _Frame):
+        # chamado com self._lock
+        frame.refs -= 1
+        if frame.refs == 0:
+            self._held_bytes -= len(frame.data)
+
+    def _on_trigger(self, reason: str, ts: float):
+        end_ts = ts + self.cfg.post_roll_sec
+        clip = self._active
+        if clip is None:
+            self._start_clip(_Clip(reason, ts, end_ts))
+            return
+        # trigger durante um clip: prolonga o post-roll até max_clip_sec
+        limit = clip.trigger_ts + max(self.cfg.max_clip_sec, self.cfg.post_roll_sec)
+        if end_ts <= limit:
+            clip.end_ts = max(clip.end_ts, end_ts)
+        elif self._next is None:
+            clip.end_ts = limit
+            self._next = _Clip(reason, ts, end_ts)
+        else:
+            self._next.end_ts = max(self._next.end_ts, end_ts)
+
+    def _start_clip(self, clip: _Clip):
+        cutoff = clip.trigger_ts - self.cfg.pre_roll_sec
+        with self._lock:
+            for frame in self._ring:
+                if frame.ts >= cutoff:
+                    self._acquire(frame)
+                    clip.frames.append(frame)
+        self._active = clip
+
+    def _add_frame(self, frame: _Frame):
+        size = len(frame.data)
+        with self._lock:
+            cutoff = frame.ts - self.cfg.pre_roll_sec
+            # tirar do ring o que saiu da janela de pre-roll ou não cabe no limite
+            while self._ring and (self._ring[0].ts < cutoff or
+                                  self._held_bytes + size > self._store_max):
+                self._release_frame(self._ring.popleft())
+            if self._held_bytes + size > self._store_max:
+                self.dropped_frames += 1
+                return
+            self._acquire(frame)
+            self._ring.append(frame)
+            if self._active is not None:
+                self._acquire(frame)
+                self._active.frames.append(frame)
+
+    def _maybe_finish_clip(self, now: float):
+        clip = self._active
+        if clip is None or now < clip.end_ts:
+            return
+        self._active = None
+        try:
+            self._write_queue.put_nowait(clip)
+        except Full:
+            self.dropped_clips += 1
+            self._release_clip(clip)
+            print(f"⚠️  Clip '{clip.reason}' descartado (escrita atrasada)")
+        pending, self._next = self._next, None
+        if pending is not None:
+            # clip chegou ao máximo com eventos por cobrir: novo clip com o seu pre-roll
+            self._start_clip(pending)
+            self._maybe_finish_clip(now)
+
+    def _release_clip(self, clip: _Clip):
+        with self._lock:
+            for frame in clip.frames:
+                self._release_frame(frame)
+        clip.frames = []
+
+    # ------------------------------------------------------------------
+    # Writer (disco)
+    # ------------------------------------------------------------------
+    def _write_loop(self):
+        while not (self._stop.is_set() and self._write_queue.empty() and not self._encoder.is_alive()):
+            try:
+                clip = self._write_queue.get(timeout=0.25)
+            except Empty:
+                continue
+            try:
+                self._write_clip(clip)
+            finally:
+                self._release_clip(clip)
+
+    def _write_clip(self, clip: _Clip):
+        if not clip.frames:
+            return
+        out_dir = Path(self.cfg.output_dir)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(clip.trigger_ts))
+        millis = int(clip.trigger_ts * 1000) % 1000
+        path = out_dir / f"clip-{stamp}-{millis:03d}-{clip.reason}.mp4"
+        try:
+            out_dir.mkdir(parents=True, exist_ok=True)
+            first = cv2.imdecode(np.frombuffer(clip.frames[0].data, np.uint8), cv2.IMREAD_COLOR)
+            h, w = first.shape[:2]
+            writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*self.cfg.codec),
+                                     float(self.cfg.fps), (w, h))
+            try:
+                for frame in clip.frames:
+                    img = cv2.imdecode(np.frombuffer(frame.data, np.uint8), cv2.IMREAD_COLOR)
+                    if img is not None and img.shape[:2] == (h, w):
+                        writer.write(img)
+            finally:
+                writer.release()
+            meta = {
+                "reason": clip.reason,
+                "trigger_ts": clip.trigger_ts,
+                "start_ts": clip.frames[0].ts,
+                "end_ts": clip.frames[-1].ts,
+                "frames": len(clip.frames),
+                "fps": self.cfg.fps,
+            }
+            with open(path.with_suffix(".json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=2)
+            self.clips_written += 1
+        except (OSError, cv2.error) as exc:
+            print(f"⚠️  Não foi possível gravar o clip {path.name}: {exc}")
@@ -0,0 +1,506 @@
+"""Hot reload of config/config.yaml while the pipeline keeps running.
+
+When the file changes it is parsed and every live setting is validated and
+converted first; an invalid file is reported and ignored, so the running
+configuration stays in effect. Valid changes are then applied in place to
+the live objects (pipeline confidence/cadence/counting line, tracker, queue
+model, emonCMS uploader/sink, button settings, cascade thresholds), keeping
+tracks and queue state.
+
+A new ``yolo_model`` (or ``cascade.accurate_model``) is loaded and warmed up
+on a background thread and then switched in with a single attribute
+assignment, so an inference already running finishes on the old model.
+Settings that cannot change live are listed as needing a restart and are not
+copied into the shared config dict, which always describes what is in effect.
+
+The sync loop calls poll() every frame (an os.stat every ``poll_sec``); the
+async runtime watches the file itself and calls reload().
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+import yaml
+
+from emoncms_client import EmonCMSConfig, EmonCMSUploader
+from metrics_sinks import EmonCMSSink, SinkConfig
+
+if TYPE_CHECKING:  # pragma: no cover
+    from button_listener import ButtonListener, ButtonListenerConfig
+    from metrics_sinks import MetricsHub
+    from pipeline import QueuePipeline
+
+DIRECTIONS = ('left_to_right', 'right_to_left')
+
+Key = Tuple[Optional[str], str]  # (secção ou None para o nível de topo, chave)
+
+
+# ============================================
+# VALIDAÇÃO / CONVERSÃO
+# ============================================
+
+def _as_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    raise ValueError(value)
+
+
+def _as_text(value: Any) -> str:
+    if isinstance(value, (dict, list)):
+        raise ValueError(value)
+    return str(value).strip()
+
+
+def _as_bgr(value: Any) -> Tuple[int, int, int]:
+    if not (isinstance(value, (list, tuple)) and len(value) == 3
+            and all(isinstance(c, int) and not isinstance(c, bool) for c in value)):
+        raise ValueError(value)
+    return tuple(value)
+
+
+def _as_int(value: Any) -> int:
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(value)
+    return int(value)
+
+
+def _as_float(value: Any) -> float:
+    if isinstance(value, bool):
+        raise ValueError(value)
+    return float(value)
+
+
+def _unit(v) -> bool:
+    return 0.0 <= v <= 1.0
+
+
+# (secção, chave): (conversão, validação, regra) -- tudo o que é aplicado em direto
+LIVE_SPEC: Dict[Key, Tuple[Callable[[Any], Any], Callable[[Any], bool], str]] = {
+    (None, 'confidence_threshold'): (_as_float, lambda v: 0.0 < v <= 1.0, "entre 0 e 1"),
+    (None, 'process_every_n_frames'): (_as_int, lambda v: v >= 1, ">= 1"),
+    (None, 'yolo_model'): (_as_text, bool, "caminho ou nome do modelo"),
+    ('counting', 'direction'): (_as_text, lambda v: v in DIRECTIONS, " ou ".join(DIRECTIONS)),
+    ('counting', 'line_band_px'): (_as_int, lambda v: v >= 0, ">= 0"),
+    ('counting', 'line_x_percent'): (_as_float, _unit, "entre 0 e 1"),
+    ('counting', 'line_color_bgr'): (_as_bgr, lambda v: all(0 <= c <= 255 for c in v), "três inteiros 0-255"),
+    ('counting', 'line_thickness'): (_as_int, lambda v: v >= 1, ">= 1"),
+    ('tracking', 'match_radius_px'): (_as_float, lambda v: v > 0, "> 0"),
+    ('tracking', 'ttl'): (_as_int, lambda v: v >= 1, ">= 1"),
+    ('queue', 'avg_service_time_sec'): (_as_float, lambda v: v > 0, "> 0"),
+    ('queue', 'window_sec'): (_as_int, lambda v: v >= 1, ">= 1"),
+    ('queue', 'wait_window'): (_as_int, lambda v: v >= 1, ">= 1"),
+    ('emoncms', 'enabled'): (_as_bool, lambda v: True, "true ou false"),
+    ('emoncms', 'base_url'): (_as_text, bool, "URL"),
+    ('emoncms', 'api_key'): (_as_text, lambda v: True, "texto"),
+    ('emoncms', 'node'): (_as_text, bool, "nome do nó"),
+    ('emoncms', 'interval_sec'): (_as_float, lambda v: v > 0, "> 0"),
+    ('emoncms', 'timeout_sec'): (_as_float, lambda v: v > 0, "> 0"),
+    ('button', 'enabled'): (_as_bool, lambda v: True, "true ou false"),
+    ('button', 'port'): (_as_text, bool, "porta série"),
+    ('button', 'baudrate'): (_as_int, lambda v: v > 0, "> 0"),
+    ('button', 'trigger_key'): (lambda v: _as_text(v)[:1], bool, "uma tecla"),
+    ('button', 'debounce_sec'): (_as_float, lambda v: v >= 0, ">= 0"),
+    ('button', 'use_button_mode'): (_as_bool, lambda v: True, "true ou false"),
+    ('button', 'service_window'): (_as_int, lambda v: v >= 1, ">= 1"),
+    ('cascade', 'accurate_model'): (_as_text, bool, "caminho ou nome do modelo"),
+    ('cascade', 'region'): (lambda v: _as_text(v).lower(), lambda v: v in ('band', 'full'), "band ou full"),
+    ('cascade', 'crowd_people'): (_as_int, lambda v: v >= 1, ">= 1"),
+    ('cascade', 'probe_confidence'): (_as_float, _unit, "entre 0 e 1"),
+    ('cascade', 'low_confidence'): (_as_float, _unit, "entre 0 e 1"),
+    ('cascade', 'low_conf_ratio'): (_as_float, _unit, "entre 0 e 1"),
+    ('cascade', 'track_loss'): (_as_int, lambda v: v >= 1, ">= 1"),
+    ('cascade', 'hold_sec'): (_as_float, lambda v: v >= 0, ">= 0"),
+}
+LIVE_SECTIONS = {section for section, _ in LIVE_SPEC if section is not None}
+
+
+def _section(cfg: Dict, name: str) -> Dict:
+    value = cfg.get(name) or {}
+    return value if isinstance(value, dict) else {}
+
+
+def _raw(cfg: Dict, key: Key) -> Any:
+    section, name = key
+    return cfg.get(name) if section is None else _section(cfg, section).get(name)
+
+
+def _key_name(key: Key) -> str:
+    section, name = key
+    return name if section is None else f"{section}.{name}"
+
+
+def parse_live(cfg: Any) -> Tuple[Dict[Key, Any], List[str]]:
+    """Converte as chaves aplicáveis em direto: (valores, erros). Chaves ausentes são omitidas."""
+    if not isinstance(cfg, dict):
+        return {}, ["o ficheiro não contém um mapa YAML"]
+    values: Dict[Key, Any] = {}
+    errors: List[str] = []
+    for section in sorted(LIVE_SECTIONS):
+        if cfg.get(section) is not None and not isinstance(cfg.get(section), dict):
+            errors.append(f"{section}: deve ser um mapa")
+    for key, (cast, ok, rule) in LIVE_SPEC.items():
+        value = _raw(cfg, key)
+        if value is None:
+            continue
+        try:
+            converted = cast(value)
+        except (TypeError, ValueError):
+            errors.append(f"{_key_name(key)}: valor inválido {value!r} ({rule})")
+            continue
+        if not ok(converted):
+            errors.append(f"{_key_name(key)}: {value!r} ({rule})")
+            continue
+        values[key] = converted
+    return values, errors
+
+
+def validate_config(cfg: Any) -> List[str]:
+    """Lista de erros (vazia se a configuração pode ser aplicada)."""
+    return parse_live(cfg)[1]
+
+
+def restart_required(old: Dict, new: Dict, live: Iterable[Key] = LIVE_SPEC) -> List[str]:
+    """Chaves alteradas de old para new que não estão em ``live`` (só têm efeito ao reiniciar)."""
+    live = set(live)
+    live_sections = {s for s, _ in live if s is not None}
+    changed = []
+    for key in sorted(set(old) | set(new)):
+        if (None, key) in live or old.get(key) == new.get(key):
+            continue
+        if key not in live_sections:
+            changed.append(key)
+            continue
+        old_s, new_s = _section(old, key), _section(new, key)
+        changed += [f"{key}.{k}" for k in sorted(set(old_s) | set(new_s))
+                    if (key, k) not in live and old_s.get(k) != new_s.get(k)]
+    return changed
+
+
+# ============================================
+# RELOADER
+# ============================================
+
+class ConfigReloader:
+    def __init__(
+        self,
+        path: Path,
+        config: Dict,
+        pipeline: "QueuePipeline",
+        load_model: Callable[[str], Any],
+        metrics_hub: Optional["MetricsHub"] = None,
+        emon_config: Optional[EmonCMSConfig] = None,
+        button_config: Optional["ButtonListenerConfig"] = None,
+        poll_sec: float = 2.0,
+    ):
+        self.path = Path(path)
+        # dicionário partilhado com main.py: descreve sempre a configuração em vigor
+        self.config = config
+        self.pipeline = pipeline
+        self.load_model = load_model
+        self.metrics_hub = metrics_hub
+        self.emon_config = emon_config
+        self.button_config = button_config
+        self.button_listener: Optional["ButtonListener"] = None
+        self.poll_sec = poll_sec
+        self.reloads = 0
+        self.rejected = 0
+        self._mtime = _mtime(self.path)
+        self._next_poll = 0.0
+        self._swap_lock = threading.Lock()
+        self._swap_pending: Dict[str, str] = {}  # alvo -> modelo pedido
+        self._swap_thread: Optional[threading.Thread] = None
+        # último modelo pedido por alvo (em vigor ou ainda a carregar)
+        self._wanted_models: Dict[str, Optional[str]] = {
+            'model': config.get('yolo_model'),
+            'cascade': _section(config, 'cascade').get('accurate_model'),
+        }
+
+    def live_keys(self) -> List[Key]:
+        """Chaves com efeito em direto nesta sessão (secções sem objeto vivo ficam de fora)."""
+        skip = set()
+        if self.pipeline.cascade is None:
+            skip.add('cascade')
+        if self.emon_config is None:
+            skip.add('emoncms')
+        if self.button_config is None:
+            skip.add('button')
+        return [key for key in LIVE_SPEC if key[0] not in skip]
+
+    def restart_required(self, new: Dict) -> List[str]:
+        """Chaves alteradas (face à config em vigor) que só têm efeito ao reiniciar."""
+        return restart_required(self.config, new, self.live_keys())
+
+    # ------------------------------------------------------------------
+    def poll(self, now: float):
+        """Para o loop síncrono: verifica o mtime a cada poll_sec."""
+        if self.poll_sec <= 0 or now < self._next_poll:
+            return
+        self._next_poll = now + self.poll_sec
+        mtime = _mtime(self.path)
+        if mtime is None or mtime == self._mtime:
+            return
+        self._mtime = mtime
+        self.reload()
+
+    def reload(self, path: Optional[Path] = None) -> bool:
+        """Lê, valida e aplica o ficheiro; devolve False se foi rejeitado (nunca lança)."""
+        path = Path(path) if path is not None else self.path
+        self._mtime = _mtime(path)
+        try:
+            with open(path, 'r') as f:
+                new = yaml.safe_load(f)
+        except (OSError, yaml.YAMLError) as exc:
+            self.rejected += 1
+            print(f"⚠️  {path.name} não foi aplicado: {exc}")
+            return False
+        values, errors = parse_live(new)
+        if errors:
+            self.rejected += 1
+            print(f"⚠️  {path.name} inválido, configuração atual mantida:")
+            for err in errors:
+                print(f"   - {err}")
+            return False
+
+        current, _ = parse_live(self.config)
+        live = self.live_keys()
+        try:
+            applied = self._apply(current, values)
+        except Exception as exc:  # nunca parar o loop de vídeo por causa de uma recarga
+            self.rejected += 1
+            print(f"⚠️  Erro ao aplicar {path.name}: {exc}")
+            return False
+        pending = self.restart_required(new)
+        self._update_effective(values, live)
+        self.reloads += 1
+        if applied:
+            print(f"🔁 {path.name} recarregado: {', '.join(applied)}")
+        if pending:
+            print(f"ℹ️  Requer reinício para aplicar: {', '.join(pending)}")
+        if not applied and not pending:
+            print(f"🔁 {path.name} recarregado (sem alterações)")
+        return True
+
+    def _update_effective(self, values: Dict[Key, Any], live: List[Key]):
+        """Copia para a config partilhada só as chaves aplicadas em direto (já convertidas)."""
+        for key in live:
+            section, name = key
+            if key in ((None, 'yolo_model'), ('cascade', 'accurate_model')):
+                continue  # só quando a troca do modelo termina
+            if key not in values:
+                continue
+            value = values[key]
+            if isinstance(value, tuple):
+                value = list(value)  # como no YAML (line_color_bgr)
+            if section is None:
+                self.config[name] = value
+            else:
+                target = self.config.get(section)
+                if not isinstance(target, dict):
+                    target = self.config[section] = {}
+                target[name] = value
+
+    # ------------------------------------------------------------------
+    def _apply(self, old: Dict[Key, Any], new: Dict[Key, Any]) -> List[str]:
+        """Aplica valores já convertidos e validados (ver parse_live)."""
+        applied: List[str] = []
+        p = self.pipeline
+
+        def changed(key: Key) -> bool:
+            return key in new and new[key] != old.get(key)
+
+        # Detecção
+        if changed((None, 'confidence_threshold')):
+            p.cfg.confidence = new[(None, 'confidence_threshold')]
+            applied.append(f"confiança={p.cfg.confidence:.2f}")
+        if changed((None, 'process_every_n_frames')):
+            p.cfg.process_every_n = new[(None, 'process_every_n_frames')]
+            applied.append(f"1 em {p.cfg.process_every_n} frames")
+        model = new.get((None, 'yolo_model'))
+        if model and model != self._wanted_models['model']:
+            self._request_swap('model', model)
+            applied.append(f"modelo → {model} (a carregar)")
+
+        # Linha de contagem (tracks mantêm-se; a linha é recalculada no próximo frame)
+        if changed(('counting', 'line_x_percent')):
+            p.cfg.line_x_percent = new[('counting', 'line_x_percent')]
+            p.line_a = p.line_b = None
+            applied.append(f"linha x={p.cfg.line_x_percent:.2f}")
+        if changed(('counting', 'line_band_px')):
+            p.cfg.line_band_px = new[('counting', 'line_band_px')]
+            applied.append(f"banda={p.cfg.line_band_px}px")
+        if changed(('counting', 'direction')):
+            p.direction = new[('counting', 'direction')]
+            applied.append(f"direção={p.direction}")
+        if changed(('counting', 'line_color_bgr')):
+            p.cfg.line_color = new[('counting', 'line_color_bgr')]
+            applied.append("cor da linha")
+        if changed(('counting', 'line_thickness')):
+            p.cfg.line_thickness = new[('counting', 'line_thickness')]
+            applied.append("espessura da linha")
+
+        # Tracker
+        if changed(('tracking', 'match_radius_px')):
+            p.tracker.match_radius_px = new[('tracking', 'match_radius_px')]
+            applied.append(f"raio do tracker={p.tracker.match_radius_px:g}px")
+        if changed(('tracking', 'ttl')):
+            p.tracker.ttl = new[('tracking', 'ttl')]
+            applied.append(f"ttl={p.tracker.ttl}")
+
+        # Modelo de fila (estado atual mantém-se)
+        qs = p.queue_stats
+        if changed(('queue', 'avg_service_time_sec')):
+            p.cfg.avg_service_time_sec = new[('queue', 'avg_service_time_sec')]
+            applied.append(f"atendimento={p.cfg.avg_service_time_sec:g}s")
+        if changed(('queue', 'window_sec')):
+            qs.window_sec = new[('queue', 'window_sec')]
+            applied.append(f"janela de chegadas={qs.window_sec}s")
+        service_window = new.get(('button', 'service_window')) if changed(('button', 'service_window')) else None
+        wait_window = new.get(('queue', 'wait_window')) if changed(('queue', 'wait_window')) else None
+        if service_window is not None or wait_window is not None:
+            qs.resize_windows(service_window=service_window, wait_window=wait_window)
+            applied.append("janelas de atendimento/espera")
+
+        applied += self._apply_emoncms(old, new)
+        applied += self._apply_button(old, new)
+        applied += self._apply_cascade(old, new)
+        return applied
+
+    @staticmethod
+    def _section_changed(section: str, old: Dict[Key, Any], new: Dict[Key, Any]) -> bool:
+        keys = {k for k in set(old) | set(new) if k[0] == section}
+        return any(k in new and new[k] != old.get(k) for k in keys)
+
+    def _apply_emoncms(self, old: Dict[Key, Any], new: Dict[Key, Any]) -> List[str]:
+        cfg = self.emon_config
+        if cfg is None or not self._section_changed('emoncms', old, new):
+            return []
+        cfg.enabled = new.get(('emoncms', 'enabled'), cfg.enabled)
+        cfg.base_url = new.get(('emoncms', 'base_url'), cfg.base_url)
+        cfg.api_key = new.get(('emoncms', 'api_key'), cfg.api_key)
+        cfg.node = new.get(('emoncms', 'node'), cfg.node)
+        cfg.interval_sec = new.get(('emoncms', 'interval_sec'), cfg.interval_sec)
+        cfg.timeout_sec = new.get(('emoncms', 'timeout_sec'), cfg.timeout_sec)
+        hub = self.metrics_hub
+        if hub is not None:
+            sink = next((s for s in hub.sinks if isinstance(s, EmonCMSSink)), None)
+            if sink is not None:
+                # o uploader partilha cfg: enabled/api_key/url aplicam-se ao próximo envio
+                sink.cfg.interval_sec = cfg.interval_sec
+            elif cfg.enabled and cfg.api_key:
+                hub.add_sink(EmonCMSSink(EmonCMSUploader(cfg), SinkConfig(interval_sec=cfg.interval_sec)))
+        state = "ON" if cfg.enabled and cfg.api_key else "OFF"
+        return [f"emonCMS {state} ({cfg.interval_sec:g}s)"]
+
+    def _apply_button(self, old: Dict[Key, Any], new: Dict[Key, Any]) -> List[str]:
+        cfg = self.button_config
+        if cfg is None or not self._section_changed('button', old, new):
+            return []
+        applied = []
+        p = self.pipeline
+        cfg.trigger_key = new.get(('button', 'trigger_key'), cfg.trigger_key)
+        cfg.debounce_sec = new.get(('button', 'debounce_sec'), cfg.debounce_sec)
+        reopen = any(
+            (('button', k) in new and new[('button', k)] != old.get(('button', k)))
+            for k in ('port', 'baudrate', 'enabled')
+        )
+        cfg.port = new.get(('button', 'port'), cfg.port)
+        cfg.baudrate = new.get(('button', 'baudrate'), cfg.baudrate)
+        cfg.enabled = new.get(('button', 'enabled'), cfg.enabled)
+        listener = self.button_listener
+        if reopen:
+            if listener is None:
+                applied.append("botão (requer reinício: não foi iniciado)")
+            else:
+                try:
+                    listener.restart()
+                    p.button_available = cfg.enabled
+                    applied.append(f"botão {'em ' + str(cfg.port) if cfg.enabled else 'OFF'}")
+                except RuntimeError as exc:
+                    p.button_available = False
+                    print(f"⚠️  Botão desativado: {exc}")
+        key = ('button', 'use_button_mode')
+        if key in new and new[key] != old.get(key):
+            p.use_button_mode = new[key] and p.button_available
+            applied.append(f"modo {'botão' if p.use_button_mode else 'automático'}")
+        if not p.button_available:
+            p.use_button_mode = False
+        return applied or [f"botão (tecla '{cfg.normalized_key()}', debounce {cfg.debounce_sec:g}s)"]
+
+    def _apply_cascade(self, old: Dict[Key, Any], new: Dict[Key, Any]) -> List[str]:
+        cascade = self.pipeline.cascade
+        if cascade is None or not self._section_changed('cascade', old, new):
+            return []
+        cfg = cascade.cfg
+        for name in ('region', 'crowd_people', 'probe_confidence', 'low_confidence',
+                     'low_conf_ratio', 'track_loss', 'hold_sec'):
+            if ('cascade', name) in new:
+                setattr(cfg, name, new[('cascade', name)])
+        applied = ["cascata"]
+        model = new.get(('cascade', 'accurate_model'))
+        if model and model != self._wanted_models['cascade']:
+            self._request_swap('cascade', model)
+            applied.append(f"modelo preciso → {model} (a carregar)")
+        return applied
+
+    # ------------------------------------------------------------------
+    # Troca de modelo em background
+    # ------------------------------------------------------------------
+    def _request_swap(self, target: str, model_name: str):
+        with self._swap_lock:
+            self._wanted_models[target] = model_name
+            self._swap_pending[target] = model_name
+            if self._swap_thread is not None and self._swap_thread.is_alive():
+                return  # a thread em curso apanha o pedido mais recente
+            self._swap_thread = threading.Thread(target=self._swap_loop, name="model-swap", daemon=True)
+            self._swap_thread.start()
+
+    def _swap_loop(self):
+        while True:
+            with self._swap_lock:
+                if not self._swap_pending:
+                    self._swap_thread = None
+                    return
+                target, model_name = self._swap_pending.popitem()
+            t0 = time.time()
+            try:
+                model = self.load_model(model_name)
+                # aquecer fora do loop de vídeo (primeira chamada inicializa o predictor)
+                model(np.zeros((64, 64, 3), dtype=np.uint8), verbose=False)
+            except Exception as exc:
+                print(f"⚠️  Não foi possível carregar '{model_name}', mantém-se o modelo atual: {exc}")
+                with self._swap_lock:
+                    if self._wanted_models.get(target) == model_name:
+                        # volta a ser possível pedir este modelo numa próxima edição
+                        self._wanted_models[target] = self._effective_model(target)
+                continue
+            with self._swap_lock:
+                if self._swap_pending.get(target) not in (None, model_name):
+                    continue  # entretanto foi pedido outro modelo
+            # troca atómica: uma inferência em curso termina com o modelo antigo
+            if target == 'cascade' and self.pipeline.cascade is not None:
+                self.pipeline.cascade.accurate_model = model
+                cascade_cfg = self.config.get('cascade')
+                if isinstance(cascade_cfg, dict):
+                    cascade_cfg['accurate_model'] = model_name
+            else:
+                self.pipeline.model = model
+                self.config['yolo_model'] = model_name
+            print(f"✅ Modelo '{model_name}' ativo ({time.time() - t0:.1f}s a carregar)")
+
+    def _effective_model(self, target: str) -> Optional[str]:
+        if target == 'cascade':
+            return _section(self.config, 'cascade').get('accurate_model')
+        return self.config.get('yolo_model')
+
+
+def _mtime(path: Path) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
@@ -0,0 +1,29 @@
+"""Line-crossing helpers used to count entries into the queue.
+
+Kept separate from main.py so they can be imported (e.g. by the benchmarks)
+without opening the camera or loading the YOLO model.
+"""
+
+from typing import Tuple
+
+
+Point = Tuple[int, int]
+
+
+def _sign(x: float, eps: float = 1e-3) -> int:
+    if x > eps:
+        return 1
+    if x < -eps:
+        return -1
+    return 0
+
+
+def _point_side(p: Point, a: Point, b: Point) -> float:
+    # cross((b - a), (p - a))
+    return (b[0] - a[0]) * (p[1] - a[1]) - (b[1] - a[1]) * (p[0] - a[0])
+
+
+def crossed_line(prev_p: Point, curr_p: Point, a: Point, b: Point) -> bool:
+    s1 = _sign(_point_side(prev_p, a, b))
+    s2 = _sign(_point_side(curr_p, a, b))
+    return s1 != 0 and s2 != 0 and s1 != s2
@@ -46,12 +46,24 @@ class EmonCMSUploader:
         self._last_sent_ts = now
         self._send(metrics)
 
+    def send_payload(self, fulljson: str, ts: Optional[float] = None):
+        """Envia já o JSON serializado, sem throttle (o chamador controla o intervalo)."""
+        if not self.enabled:
+            return
+        self._last_sent_ts = time.time()
+        self._post(fulljson, ts)
+
     def _send(self, metrics: Dict[str, int | float | str]):
+        self._post(json.dumps(metrics, separators=(",", ":")))
+
+    def _post(self, fulljson: str, ts: Optional[float] = None):
         params = {
             "node": self.cfg.node,
             "apikey": self.cfg.api_key,
-            "fulljson": json.dumps(metrics, separators=(",", ":")),
+            "fulljson": fulljson,
         }
+        if ts is not None:
+            params["time"] = str(int(ts))
         try:
             resp = requests.get(
                 self.cfg.base_url,
@@ -0,0 +1,115 @@
+"""Monte Carlo ETA distribution for a customer joining the queue now.
+
+``QueueStats.eta_for_new`` gives a point estimate (queue length x mean service
+time). This engine simulates thousands of queue futures at once with NumPy:
+the service in progress gets a residual time conditioned on how long it has
+been running, and every customer ahead draws a service duration. Durations are
+bootstrapped from the observed history (``QueueStats._service_durations``),
+rescaled to the mean service time in effect, or drawn from a gamma
+distribution while there is not enough history.
+
+Results are cached and only recomputed when an input changes materially
+(queue length, new service observations, mean service time beyond a
+tolerance, or the in-progress service crossing another ``recompute_sec``
+step), so calling it every frame costs a tuple comparison.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+@dataclass
+class EtaEngineConfig:
+    enabled: bool = False
+    samples: int = 2000                 # futuros simulados por cálculo
+    percentiles: List[int] = field(default_factory=lambda: [50, 90])
+    min_history: int = 5                # durações observadas para usar a distribuição empírica
+    fallback_cv: float = 0.5            # variabilidade (desvio/média) sem histórico suficiente
+    mean_tolerance: float = 0.05        # variação relativa do tempo médio que força novo cálculo
+    recompute_sec: float = 2.0          # passo do tempo decorrido do atendimento em curso
+    max_queue: int = 100                # fila máxima simulada (acima disso, escala linearmente)
+    seed: Optional[int] = None
+
+
+class MonteCarloEta:
+    def __init__(self, cfg: EtaEngineConfig):
+        self.cfg = cfg
+        self.recomputes = 0
+        self._rng = np.random.default_rng(cfg.seed)
+        self._key: Optional[Tuple] = None
+        self._result: Dict[int, int] = {}
+
+    def percentiles(self, queue_len: int, durations: Sequence[float], history_version: int,
+                    mean_service_sec: float, elapsed_sec: float) -> Dict[int, int]:
+        """{percentil: ETA em segundos} para quem entra agora na fila."""
+        if queue_len <= 0 or mean_service_sec <= 0:
+            return {p: 0 for p in self.cfg.percentiles}
+        key = self._cache_key(queue_len, len(durations), history_version, mean_service_sec, elapsed_sec)
+        if key != self._key:
+            self._result = self._simulate(queue_len, durations, mean_service_sec, elapsed_sec)
+            self._key = key
+            self.recomputes += 1
+        return self._result
+
+    def _cache_key(self, queue_len: int, n_hist: int, history_version: int,
+                   mean_service_sec: float, elapsed_sec: float) -> Tuple:
+        tol = max(1e-3, self.cfg.mean_tolerance)
+        mean_bucket = int(math.log(mean_service_sec) / math.log1p(tol))
+        elapsed_bucket = int(max(0.0, elapsed_sec) // max(0.1, self.cfg.recompute_sec))
+        # histórico só conta enquanto é usado (acima de min_history)
+        hist = history_version if n_hist >= self.cfg.min_history else -1
+        return (queue_len, hist, mean_bucket, elapsed_bucket)
+
+    # ------------------------------------------------------------------
+    def _history(self, durations: Sequence[float], mean_service_sec: float) -> Optional[np.ndarray]:
+        if len(durations) < self.cfg.min_history:
+            return None
+        hist = np.asarray(durations, dtype=np.float64)
+        # forma observada, média em vigor (botão ou tempo configurado)
+        return hist * (mean_service_sec / hist.mean())
+
+    def _draw(self, hist: Optional[np.ndarray], mean_service_sec: float, size) -> np.ndarray:
+        if hist is not None:
+            return self._rng.choice(hist, size=size)
+        cv = self.cfg.fallback_cv
+        if cv <= 0:
+            return np.full(size, mean_service_sec)
+        shape = 1.0 / (cv * cv)
+        return self._rng.gamma(shape, mean_service_sec / shape, size=size)
+
+    def _draw_remaining(self, hist: Optional[np.ndarray], mean_service_sec: float,
+                        elapsed_sec: float, n: int) -> np.ndarray:
+        """Tempo restante do atendimento em curso, dado que já dura elapsed_sec."""
+        if elapsed_sec <= 0:
+            return self._draw(hist, mean_service_sec, n)
+        if hist is not None:
+            longer = hist[hist > elapsed_sec]
+            if longer.size:
+                return self._rng.choice(longer, size=n) - elapsed_sec
+            # já passou de tudo o que foi observado: sem memória (exponencial com a média)
+            return self._rng.exponential(mean_service_sec, size=n)
+        remaining = self._draw(None, mean_service_sec, n) - elapsed_sec
+        overdue = remaining <= 0
+        if overdue.any():
+            remaining[overdue] = self._rng.exponential(mean_service_sec, size=int(overdue.sum()))
+        return remaining
+
+    def _simulate(self, queue_len: int, durations: Sequence[float], mean_service_sec: float,
+                  elapsed_sec: float) -> Dict[int, int]:
+        n = max(100, int(self.cfg.samples))
+        q = min(queue_len, max(1, self.cfg.max_queue))
+        hist = self._history(durations, mean_service_sec)
+
+        # linhas = futuros simulados; colunas = pessoas à frente
+        eta = self._draw_remaining(hist, mean_service_sec, elapsed_sec, n)
+        if q > 1:
+            eta = eta + self._draw(hist, mean_service_sec, (n, q - 1)).sum(axis=1)
+        if queue_len > q:
+            eta = eta * (queue_len / q)
+        values = np.percentile(eta, self.cfg.percentiles)
+        return {p: int(round(v)) for p, v in zip(self.cfg.percentiles, values)}
@@ -0,0 +1,312 @@
+"""Multi-node federation of queue state over UDP.
+
+Each smart-queue box runs a FederationPublisher that sends compact state
+messages (cumulative entries / services since the node booted, plus the
+current queue length, arrival rate and service time) to an aggregator. The
+aggregator keeps per-node state, computes the site-wide queue length and ETA
+in real time and drops nodes that stop reporting.
+
+Messages are small JSON datagrams with a per-node boot id and sequence
+number, so lost, duplicated or reordered packets are detected and a restarted
+node is recognised. Every field is absolute: the aggregator derives the
+increments itself per boot id, so a lost packet delays a counter until the
+next message instead of undercounting it, and totals from earlier boots of a
+node are kept.
+
+Run on one machine for testing (terminais separados):
+    python src/federation.py aggregate --port 9871
+    python src/federation.py simulate --node caixa-1 --port 9871
+    python src/federation.py simulate --node caixa-2 --port 9871
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Set, Tuple
+
+PROTOCOL_VERSION = 2
+
+
+@dataclass
+class FederationConfig:
+    enabled: bool = False
+    role: str = "node"                 # 'node' (publica) ou 'aggregator' (recebe)
+    node_id: str = "smart-queue"
+    host: str = "127.0.0.1"            # aggregator (node) ou interface de escuta (aggregator)
+    port: int = 9871
+    heartbeat_sec: float = 2.0         # envio mínimo mesmo sem alterações
+    min_interval_sec: float = 0.2      # limite de mensagens por segundo por nó
+    node_timeout_sec: float = 10.0     # nó sem mensagens é considerado offline
+
+
+# ============================================
+# NODE
+# ============================================
+
+class FederationPublisher:
+    """Sends node state to the aggregator; maybe_publish() is non-blocking (UDP)."""
+
+    def __init__(self, cfg: FederationConfig):
+        self.cfg = cfg
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+        self._addr = (cfg.host, int(cfg.port))
+        self._boot = random.getrandbits(31)
+        self._seq = 0
+        self._last_sent = 0.0
+        self._last_state: Optional[Tuple] = None
+        self._last_error_msg: Optional[str] = None
+
+    def maybe_publish(self, now: float, entries: int, services: int, queue_len: int,
+                      arrival_rate_min: float, service_time_sec: float):
+        """Envia o estado se mudou (ou no heartbeat); entries/services são totais desde o arranque."""
+        if now - self._last_sent < self.cfg.min_interval_sec:
+            return
+        state = (entries, services, queue_len, round(arrival_rate_min, 2), round(service_time_sec, 1))
+        if state == self._last_state and now - self._last_sent < self.cfg.heartbeat_sec:
+            return
+        self._seq += 1
+        msg = {
+            "v": PROTOCOL_VERSION,
+            "n": self.cfg.node_id,
+            "b": self._boot,
+            "s": self._seq,
+            "t": round(now, 3),
+            "e": int(entries),    # total de entradas deste arranque
+            "sv": int(services),  # total de atendimentos deste arranque
+            "q": int(queue_len),
+            "ar": round(arrival_rate_min, 3),
+            "st": round(service_time_sec, 2),
+        }
+        try:
+            self._sock.sendto(json.dumps(msg, separators=(",", ":")).encode("utf-8"), self._addr)
+            self._last_error_msg = None
+        except OSError as exc:
+            msg_err = f"Federação: envio falhou: {exc}"
+            if msg_err != self._last_error_msg:
+                print(f"⚠️  {msg_err}")
+                self._last_error_msg = msg_err
+            return
+        self._last_sent = now
+        self._last_state = state
+
+    def close(self):
+        self._sock.close()
+
+
+# ============================================
+# AGGREGATOR
+# ============================================
+
+class _NodeState:
+    __slots__ = ('node_id', 'boot', 'old_boots', 'seq', 'last_seen', 'entries', 'services',
+                 'boot_entries', 'boot_services', 'queue_len', 'arrival_rate_min',
+                 'service_time_sec', 'lost')
+
+    def __init__(self, node_id: str):
+        self.node_id = node_id
+        self.boot = None
+        self.old_boots: Set[int] = set()  # arranques anteriores (pacotes atrasados são ignorados)
+        self.seq = 0
+        self.last_seen = 0.0
+        self.entries = 0        # totais do nó (todos os arranques)
+        self.services = 0
+        self.boot_entries = 0   # último total recebido no arranque atual
+        self.boot_services = 0
+        self.queue_len = 0
+        self.arrival_rate_min = 0.0
+        self.service_time_sec = 0.0
+        self.lost = 0
+
+
+class FederationAggregator:
+    """Receives node state on a UDP socket (daemon thread) and keeps site state."""
+
+    def __init__(self, cfg: FederationConfig):
+        self.cfg = cfg
+        self._nodes: Dict[str, _NodeState] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sock: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.cfg.host, int(self.cfg.port)))
+        self._sock.settimeout(0.5)
+        self._thread = threading.Thread(target=self._run, name="federation", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+        if self._sock:
+            self._sock.close()
+
+    def _run(self):
+        assert self._sock is not None
+        while not self._stop.is_set():
+            try:
+                data, _ = self._sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self._stop.is_set():
+                    return
+                continue
+            self.handle_message(data, time.time())
+
+    def handle_message(self, data: bytes, now: float) -> bool:
+        """Aplica um datagrama; False se for inválido, de outra versão, duplicado ou atrasado."""
+        try:
+            msg = json.loads(data.decode("utf-8"))
+            if not isinstance(msg, dict) or msg.get("v") != PROTOCOL_VERSION:
+                return False
+            node_id = str(msg["n"])
+            boot = int(msg.get("b", 0))
+            seq = int(msg["s"])
+            entries = max(0, int(msg.get("e", 0)))
+            services = max(0, int(msg.get("sv", 0)))
+            queue_len = max(0, int(msg.get("q", 0)))
+            arrival_rate_min = float(msg.get("ar", 0.0))
+            service_time_sec = float(msg.get("st", 0.0))
+        except (ValueError, KeyError, TypeError, OverflowError, UnicodeDecodeError):
+            return False
+        with self._lock:
+            node = self._nodes.get(node_id)
+            if node is None:
+                node = self._nodes[node_id] = _NodeState(node_id)
+            if boot != node.boot:
+                if boot in node.old_boots:
+                    return False  # pacote atrasado de um arranque anterior
+                # nó novo ou reiniciado: sequência e totais recomeçam
+                if node.boot is not None:
+                    node.old_boots.add(node.boot)
+                node.boot = boot
+                node.boot_entries = node.boot_services = 0
+            elif seq <= node.seq:
+                return False  # duplicado/atrasado
+            elif seq > node.seq + 1:
+                node.lost += seq - node.seq - 1
+            node.seq = seq
+            node.last_seen = now
+            # incremento calculado aqui: um pacote perdido só atrasa a contagem
+            node.entries += max(0, entries - node.boot_entries)
+            node.services += max(0, services - node.boot_services)
+            node.boot_entries = max(node.boot_entries, entries)
+            node.boot_services = max(node.boot_services, services)
+            node.queue_len = queue_len
+            node.arrival_rate_min = arrival_rate_min
+            node.service_time_sec = service_time_sec
+        return True
+
+    def site_state(self, now: Optional[float] = None) -> Dict:
+        """
+        Site-wide view over online nodes. ETA assumes the boxes serve in
+        parallel: total queue divided by the combined service rate.
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            nodes = list(self._nodes.values())
+        online = [n for n in nodes if now - n.last_seen <= self.cfg.node_timeout_sec]
+        queue_len = sum(n.queue_len for n in online)
+        service_rate_per_sec = sum(1.0 / n.service_time_sec for n in online if n.service_time_sec > 0)
+        eta_sec = int(queue_len / service_rate_per_sec) if queue_len and service_rate_per_sec > 0 else 0
+        return {
+            "nodes_online": len(online),
+            "nodes_total": len(nodes),
+            "queue_len": queue_len,
+            "eta_sec": eta_sec,
+            "entries": sum(n.entries for n in nodes),
+            "services": sum(n.services for n in nodes),
+            "arrival_rate_min": round(sum(n.arrival_rate_min for n in online), 3),
+            "packets_lost": sum(n.lost for n in nodes),
+            "nodes": {
+                n.node_id: {
+                    "online": int(now - n.last_seen <= self.cfg.node_timeout_sec),
+                    "queue_len": n.queue_len,
+                    "age_sec": round(now - n.last_seen, 1),
+                }
+                for n in nodes
+            },
+        }
+
+
+# ============================================
+# CLI (testes locais com vários processos)
+# ============================================
+
+def _cmd_aggregate(args):
+    agg = FederationAggregator(FederationConfig(host=args.host, port=args.port,
+                                                node_timeout_sec=args.timeout))
+    agg.start()
+    print(f"📡 Aggregator à escuta em {args.host}:{args.port}")
+    try:
+        while True:
+            time.sleep(args.every)
+            state = agg.site_state()
+            print(f"🏢 nós {state['nodes_online']}/{state['nodes_total']} | fila {state['queue_len']} | "
+                  f"ETA {state['eta_sec']}s | entradas {state['entries']} | perdidos {state['packets_lost']}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agg.stop()
+
+
+def _cmd_simulate(args):
+    """Nó sintético: chegadas Poisson e atendimentos a service_time médio."""
+    pub = FederationPublisher(FederationConfig(node_id=args.node, host=args.host, port=args.port))
+    rnd = random.Random(args.node)
+    entries = services = queue_len = 0
+    arrivals = []
+    print(f"🧪 Nó '{args.node}' a publicar para {args.host}:{args.port}")
+    try:
+        while True:
+            now = time.time()
+            if rnd.random() < args.arrivals_per_min / 60.0 * 0.1:
+                entries += 1
+                queue_len += 1
+                arrivals.append(now)
+            if queue_len and rnd.random() < 0.1 / args.service_time:
+                services += 1
+                queue_len -= 1
+            arrivals = [t for t in arrivals if now - t <= 120]
+            pub.maybe_publish(now, entries, services, queue_len, len(arrivals) / 2.0, args.service_time)
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pub.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Smart Queue - federação de nós")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    agg = sub.add_parser("aggregate", help="receber estado dos nós e mostrar visão do local")
+    agg.add_argument("--host", default="0.0.0.0")
+    agg.add_argument("--port", type=int, default=9871)
+    agg.add_argument("--timeout", type=float, default=10.0)
+    agg.add_argument("--every", type=float, default=1.0)
+    agg.set_defaults(func=_cmd_aggregate)
+    sim = sub.add_parser("simulate", help="nó sintético (sem câmara) para testes")
+    sim.add_argument("--node", required=True)
+    sim.add_argument("--host", default="127.0.0.1")
+    sim.add_argument("--port", type=int, default=9871)
+    sim.add_argument("--arrivals-per-min", type=float, default=6.0)
+    sim.add_argument("--service-time", type=float, default=20.0)
+    sim.set_defaults(func=_cmd_simulate)
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
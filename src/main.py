@@ -13,13 +13,27 @@ Autor: Abel Dias e Simão Marcos
 import cv2
 import yaml
 import time
+import signal
 from queue import Queue, Empty
 from pathlib import Path
+from dataclasses import replace
 from ultralytics.models.yolo import YOLO
-from vision import detect_people, draw_detections, draw_info
 from queue_metrics import QueueStats
 from tracker import SimpleTracker
+from pipeline import QueuePipeline, PipelineConfig, ControlKeys, DisplayState
+from vision import TiledDetector, TilingConfig
+from motion_gate import MotionGate, MotionGateConfig
+from cascade import CascadeConfig, ModelCascade
+from eta_engine import EtaEngineConfig, MonteCarloEta
+from profiler import FrameProfiler, ProfilerConfig
+from clip_recorder import ClipRecorder, ClipRecorderConfig
+from async_runtime import AsyncRuntime, RuntimeConfig
+from federation import FederationAggregator, FederationConfig, FederationPublisher
+from config_reload import ConfigReloader
 from emoncms_client import EmonCMSUploader, EmonCMSConfig
+from metrics_sinks import (
+    MetricsHub, MetricsSink, SinkConfig, EmonCMSSink, FileSink, UdpSink, StdoutSink,
+)
 from button_listener import ButtonListener, ButtonListenerConfig
 
 # ============================================
@@ -49,16 +63,88 @@ _controls = CONFIG.get('controls', {})
 _metrics = CONFIG.get('metrics', {})  # será removido quando window_sec migrar para queue
 _emoncms = CONFIG.get('emoncms', {})
 _button = CONFIG.get('button', {})
+_runtime = CONFIG.get('runtime', {})
+_sinks = CONFIG.get('sinks', {}) or {}
+_tiling = CONFIG.get('tiling', {}) or {}
+_profiler = CONFIG.get('profiler', {}) or {}
+_recorder = CONFIG.get('recorder', {}) or {}
+_federation = CONFIG.get('federation', {}) or {}
+_motion_gate = CONFIG.get('motion_gate', {}) or {}
+_eta_engine = CONFIG.get('eta_engine', {}) or {}
+_cascade = CONFIG.get('cascade', {}) or {}
 
 # Tracking e contagem
 TRACK_MATCH_RADIUS_PX = _tracking.get('match_radius_px', 60)
 TRACK_TTL = _tracking.get('ttl', 6)
+TRACK_HISTORY_LEN = int(_tracking.get('history_len', 32))
+TRACK_REENTRY_SEC = float(_tracking.get('reentry_sec', 5.0))
+TRACK_REENTRY_RADIUS_PX = float(_tracking.get('reentry_radius_px', 120))
 LINE_BAND_PX = _counting.get('line_band_px', 100)
 LINE_X_PERCENT = float(_counting.get('line_x_percent', 0.5))
 DIRECTION = _counting.get('direction', 'left_to_right')
 LINE_COLOR = tuple(_counting.get('line_color_bgr', [0, 0, 255]))
 LINE_THICKNESS = int(_counting.get('line_thickness', 2))
 
+# Inferência por tiles (câmaras de alta resolução)
+TILING_CONFIG = TilingConfig(
+    enabled=bool(_tiling.get('enabled', False)),
+    tile_size=int(_tiling.get('tile_size', 640)),
+    overlap=float(_tiling.get('overlap', 0.2)),
+    region=str(_tiling.get('region', 'full')).lower(),
+    active_tiles=[int(i) for i in (_tiling.get('active_tiles') or [])],
+    full_frame_pass=bool(_tiling.get('full_frame_pass', True)),
+    nms_iou=float(_tiling.get('nms_iou', 0.5)),
+    merge_ios=float(_tiling.get('merge_ios', 0.8)),
+)
+
+# Cascata de modelos (rápido por defeito, preciso quando a cena é difícil)
+CASCADE_CONFIG = CascadeConfig(
+    enabled=bool(_cascade.get('enabled', False)),
+    accurate_model=str(_cascade.get('accurate_model', 'models/yolov8s.pt')),
+    region=str(_cascade.get('region', 'band')).lower(),
+    crowd_people=max(1, int(_cascade.get('crowd_people', 6))),
+    probe_confidence=float(_cascade.get('probe_confidence', 0.25)),
+    low_confidence=float(_cascade.get('low_confidence', 0.6)),
+    low_conf_ratio=float(_cascade.get('low_conf_ratio', 0.3)),
+    track_loss=max(1, int(_cascade.get('track_loss', 1))),
+    hold_sec=float(_cascade.get('hold_sec', 3.0)),
+)
+
+# Motion gate (salta a inferência quando a banda está parada)
+MOTION_GATE_CONFIG = MotionGateConfig(
+    enabled=bool(_motion_gate.get('enabled', False)),
+    region=str(_motion_gate.get('region', 'band')).lower(),
+    band_margin_px=int(_motion_gate.get('band_margin_px', 50)),
+    sample_width=int(_motion_gate.get('sample_width', 160)),
+    pixel_threshold=int(_motion_gate.get('pixel_threshold', 25)),
+    min_changed_ratio=float(_motion_gate.get('min_changed_ratio', 0.005)),
+    hold_sec=float(_motion_gate.get('hold_sec', 1.0)),
+    max_skip_sec=float(_motion_gate.get('max_skip_sec', 5.0)),
+)
+
+# Profiler sob pedido
+PROFILER_CONFIG = ProfilerConfig(
+    mode=str(_profiler.get('mode', 'cprofile')).lower(),
+    frames=max(1, int(_profiler.get('frames', 300))),
+    interval_ms=float(_profiler.get('interval_ms', 5.0)),
+    output_dir=ROOT_DIR / str(_profiler.get('output_dir', 'data/profiles')),
+)
+
+# Gravação de clips de eventos (pre-roll em memória)
+RECORDER_CONFIG = ClipRecorderConfig(
+    enabled=bool(_recorder.get('enabled', False)),
+    triggers=[str(t).lower() for t in (_recorder.get('triggers') or ['entry', 'led'])],
+    pre_roll_sec=float(_recorder.get('pre_roll_sec', 5)),
+    post_roll_sec=float(_recorder.get('post_roll_sec', 5)),
+    fps=float(_recorder.get('fps', 10)),
+    scale=float(_recorder.get('scale', 0.5)),
+    jpeg_quality=int(_recorder.get('jpeg_quality', 70)),
+    max_buffer_mb=float(_recorder.get('max_buffer_mb', 64)),
+    output_dir=ROOT_DIR / str(_recorder.get('output_dir', 'data/clips')),
+    codec=str(_recorder.get('codec', 'mp4v')),
+    max_clip_sec=float(_recorder.get('max_clip_sec', 30)),
+)
+
 # Display/debug
 SHOW_BOXES = bool(_display.get('show_boxes', True))
 SHOW_BAND = bool(_display.get('show_band', False))
@@ -69,6 +155,16 @@ SHOW_METRICS = bool(_display.get('show_metrics', False))
 # Fila/ETA
 AVG_SERVICE_TIME_SEC = int(_queue.get('avg_service_time_sec', 20))
 METRICS_WINDOW_SEC = int(_queue.get('window_sec', _metrics.get('window_sec', 120)))
+WAIT_WINDOW = max(1, int(_queue.get('wait_window', 50)))
+ETA_ENGINE_CONFIG = EtaEngineConfig(
+    enabled=bool(_eta_engine.get('enabled', False)),
+    samples=max(100, int(_eta_engine.get('samples', 2000))),
+    percentiles=[int(p) for p in (_eta_engine.get('percentiles') or [50, 90])],
+    min_history=max(1, int(_eta_engine.get('min_history', 5))),
+    fallback_cv=float(_eta_engine.get('fallback_cv', 0.5)),
+    mean_tolerance=float(_eta_engine.get('mean_tolerance', 0.05)),
+    recompute_sec=float(_eta_engine.get('recompute_sec', 2.0)),
+)
 
 # Botão físico
 BUTTON_CONFIG = ButtonListenerConfig(
@@ -92,6 +188,63 @@ EMON_CONFIG = EmonCMSConfig(
 )
 EMON_UPLOADER = EmonCMSUploader(EMON_CONFIG) if EMON_CONFIG.enabled and EMON_CONFIG.api_key else None
 
+# Sinks de métricas (cada um com rate limit, batch e fila própria)
+SINK_QUEUE_SIZE = max(1, int(_sinks.get('queue_size', 64)))
+
+
+def _sink_config(section: dict, default_interval: float) -> SinkConfig:
+    return SinkConfig(
+        interval_sec=float(section.get('interval_sec', default_interval)),
+        batch_size=max(1, int(section.get('batch_size', 1))),
+        flush_sec=float(section.get('flush_sec', 0.0)),
+        queue_size=int(section.get('queue_size', SINK_QUEUE_SIZE)),
+    )
+
+
+def build_metric_sinks() -> list[MetricsSink]:
+    sinks: list[MetricsSink] = []
+    if EMON_UPLOADER:
+        sinks.append(EmonCMSSink(EMON_UPLOADER, _sink_config({'interval_sec': EMON_CONFIG.interval_sec}, 5)))
+    _file = _sinks.get('file', {}) or {}
+    if _file.get('enabled', False):
+        path = Path(_file.get('path', 'data/metrics.jsonl'))
+        path = path if path.is_absolute() else ROOT_DIR / path
+        sinks.append(FileSink(path, _sink_config(_file, 5), fmt=str(_file.get('format', 'jsonl'))))
+    _udp = _sinks.get('udp', {}) or {}
+    if _udp.get('enabled', False):
+        sinks.append(UdpSink(
+            str(_udp.get('host', '127.0.0.1')),
+            int(_udp.get('port', 9870)),
+            _sink_config(_udp, 1),
+            topic=str(_udp.get('topic', 'smart-queue/metrics')),
+        ))
+    _stdout = _sinks.get('stdout', {}) or {}
+    if _stdout.get('enabled', False):
+        sinks.append(StdoutSink(_sink_config(_stdout, 10)))
+    return sinks
+
+
+# Federação (vários nós -> aggregator)
+FEDERATION_CONFIG = FederationConfig(
+    enabled=bool(_federation.get('enabled', False)),
+    role=str(_federation.get('role', 'node')).lower(),
+    node_id=str(_federation.get('node_id', 'smart-queue')),
+    host=str(_federation.get('host', '127.0.0.1')),
+    port=int(_federation.get('port', 9871)),
+    heartbeat_sec=float(_federation.get('heartbeat_sec', 2.0)),
+    min_interval_sec=float(_federation.get('min_interval_sec', 0.2)),
+    node_timeout_sec=float(_federation.get('node_timeout_sec', 10.0)),
+)
+
+# Runtime (loop síncrono clássico ou asyncio)
+RUNTIME_CONFIG = RuntimeConfig(
+    mode=str(_runtime.get('mode', 'sync')).lower(),
+    tick_interval_sec=float(_runtime.get('tick_interval_sec', 0.5)),
+    http_host=str(_runtime.get('http_host', '127.0.0.1')),
+    http_port=int(_runtime.get('http_port', 0) or 0),
+    config_poll_sec=float(_runtime.get('config_poll_sec', 2.0)),
+)
+
 # Controlo (teclas configuráveis)
 QUIT_KEY = _controls.get('quit', 'q').lower()
 DEBUG_KEY = _controls.get('toggle_debug', 'd').lower()
@@ -101,50 +254,132 @@ ETA_KEY = _controls.get('toggle_eta', 'e').lower()
 DIR_KEY = _controls.get('toggle_direction', 'r').lower()
 METRICS_KEY = _controls.get('toggle_metrics', 'm').lower()
 SERVICE_MODE_KEY = _controls.get('toggle_service_mode', 't').lower()
+PROFILE_KEY = _controls.get('profile', 'p').lower()
+
+def load_yolo(model_name: str):
+    """Carrega um modelo YOLO (caminho relativo à raiz do projeto ou identificador Ultralytics)."""
+    # Resolver caminho do modelo (suporta caminho relativo à raiz do projeto)
+    model_cfg_path = Path(model_name)
+    resolved_model_path = model_cfg_path if model_cfg_path.is_absolute() else (ROOT_DIR / model_cfg_path)
+
+    if resolved_model_path.exists():
+        model = YOLO(str(resolved_model_path))
+        print(f"✅ Modelo carregado de: {resolved_model_path}")
+    else:
+        # Fallback: usar identificador do modelo (Ultralytics faz download se necessário)
+        print(f"ℹ️  Modelo local não encontrado em '{resolved_model_path}'. A tentar carregar '{model_name}'.")
+        model = YOLO(model_name)
+        print("✅ Modelo carregado com sucesso (Ultralytics)")
+    return model
+
 
 # Carregar modelo YOLO
 # Na primeira execução faz download automático (~6MB para nano)
 print("🔄 A carregar modelo YOLO...")
+MODEL = load_yolo(YOLO_MODEL)
 
-# Resolver caminho do modelo (suporta caminho relativo à raiz do projeto)
-_model_cfg_path = Path(YOLO_MODEL)
-_resolved_model_path = _model_cfg_path if _model_cfg_path.is_absolute() else (ROOT_DIR / _model_cfg_path)
-
-if _resolved_model_path.exists():
-    MODEL = YOLO(str(_resolved_model_path))
-    print(f"✅ Modelo carregado de: {_resolved_model_path}")
-else:
-    # Fallback: usar identificador do modelo (Ultralytics faz download se necessário)
-    print(f"ℹ️  Modelo local não encontrado em '{_resolved_model_path}'. A tentar carregar '{YOLO_MODEL}'.")
-    MODEL = YOLO(YOLO_MODEL)
-    print("✅ Modelo carregado com sucesso (Ultralytics)")
+# Cascata: o modelo preciso fica carregado durante toda a sessão
+CASCADE_MODEL = None
+if CASCADE_CONFIG.enabled:
+    print(f"🔄 A carregar modelo preciso da cascata ({CASCADE_CONFIG.accurate_model})...")
+    CASCADE_MODEL = load_yolo(CASCADE_CONFIG.accurate_model)
 
 # ============================================
-# LINE-CROSSING HELPERS
+# MAIN
 # ============================================
 
-def _sign(x: float, eps: float = 1e-3) -> int:
-    if x > eps:
-        return 1
-    if x < -eps:
-        return -1
-    return 0
+WINDOW_NAME = 'Smart Queue - Sistema de Detecção'
+
+
+def _profile_label(pipeline: QueuePipeline) -> dict:
+    """Configuração em vigor, gravada junto de cada profile."""
+    config = {k: v for k, v in CONFIG.items() if k != 'emoncms'}
+    config['emoncms'] = {k: v for k, v in (CONFIG.get('emoncms') or {}).items() if k != 'api_key'}
+    return {
+        'config': config,
+        'runtime_mode': RUNTIME_CONFIG.mode,
+        'yolo_model': CONFIG.get('yolo_model', YOLO_MODEL),
+        'cascade_model': CASCADE_CONFIG.accurate_model if CASCADE_CONFIG.enabled else None,
+        'direction': pipeline.direction,
+        'use_button_mode': pipeline.use_button_mode,
+        'fps': round(pipeline.fps, 2),
+    }
+
+
+def start_federation(pipeline: QueuePipeline):
+    """Liga o nó ao aggregator; no papel 'aggregator' também recebe os outros nós."""
+    cfg = FEDERATION_CONFIG
+    if cfg.role == 'aggregator':
+        site = FederationAggregator(cfg)
+        try:
+            site.start()
+        except OSError as exc:
+            print(f"⚠️  Federação desativada: não foi possível escutar em {cfg.host}:{cfg.port} ({exc})")
+            return
+        pipeline.site = site
+        # o próprio aggregator também conta como nó do local
+        local_host = '127.0.0.1' if cfg.host in ('', '0.0.0.0') else cfg.host
+        pipeline.federation = FederationPublisher(replace(cfg, host=local_host))
+        print(f"🏢 Aggregator de federação em {cfg.host}:{cfg.port} (nó '{cfg.node_id}')")
+    else:
+        pipeline.federation = FederationPublisher(cfg)
+        print(f"📡 Federação: nó '{cfg.node_id}' a publicar para {cfg.host}:{cfg.port}")
+
+
+def _run_sync_loop(cap, pipeline: QueuePipeline, metrics_hub: MetricsHub,
+                   button_events: Queue, button_listener, reloader: ConfigReloader):
+    """Loop clássico: botão e LED são tratados a cada frame."""
+    while True:
+        if pipeline.profiler is not None:
+            pipeline.profiler.on_frame()
+
+        ret, frame = cap.read()
+        if not ret:
+            print("❌ Erro ao ler frame")
+            break
+
+        pipeline.ensure_line(frame)
+
+        # Atualizar drenagem do modelo simulado por tempo decorrido / botão
+        now = time.time()
+        service_events = []
+        while True:
+            try:
+                service_events.append(button_events.get_nowait())
+            except Empty:
+                break
+        pipeline.register_service_events(service_events)
+        pipeline.advance_clock(now)
+        pipeline.publish_federation(now)
 
+        # Recarregar config.yaml se mudou (só um stat a cada config_poll_sec)
+        reloader.poll(now)
 
-def _point_side(p, a, b) -> float:
-    # cross((b - a), (p - a))
-    return (b[0] - a[0]) * (p[1] - a[1]) - (b[1] - a[1]) * (p[0] - a[0])
+        # Calcular FPS
+        pipeline.count_frame(time.time())
 
+        # Fazer detecção a cada N frames (para otimizar performance)
+        if pipeline.should_infer(frame, now):
+            pipeline.process_frame(frame, now)
 
-def _crossed_line(prev_p, curr_p, a, b) -> bool:
-    s1 = _sign(_point_side(prev_p, a, b))
-    s2 = _sign(_point_side(curr_p, a, b))
-    return s1 != 0 and s2 != 0 and s1 != s2
+        # Métricas só são construídas quando um sink as pede ou o HUD as mostra
+        snapshot = metrics_hub.poll(time.time(), need=pipeline.display.show_metrics)
+        frame = pipeline.render(frame, snapshot.metrics if snapshot else None)
 
+        # Controlar LED vermelho baseado no ETA
+        led_should_be_on = pipeline.update_alert(now)
+        if button_listener:
+            button_listener.set_led(led_should_be_on)
+
+        # Mostrar resultado
+        pipeline.record(frame, now)
+        cv2.imshow(WINDOW_NAME, frame)
+
+        # Verificar tecla pressionada
+        key = cv2.waitKey(1) & 0xFF
+        if not pipeline.handle_key(chr(key).lower()):
+            break
 
-# ============================================
-# MAIN
-# ============================================
 
 def main():
     """Loop principal do sistema de detecção."""
@@ -170,8 +405,14 @@ def main():
     print()
     print("⚙️  Configuração:")
     print(f"  - Modelo: {YOLO_MODEL}")
+    if CASCADE_CONFIG.enabled:
+        print(f"  - Cascata: {CASCADE_CONFIG.accurate_model} na região '{CASCADE_CONFIG.region}' "
+              f"(≥{CASCADE_CONFIG.crowd_people} pessoas, confiança baixa ou tracks perdidos)")
     print(f"  - Processar: 1 em cada {PROCESS_EVERY_N} frames")
     print(f"  - Confiança mínima: {CONFIDENCE:.0%}")
+    if TILING_CONFIG.enabled:
+        print(f"  - Tiles: {TILING_CONFIG.tile_size}px, sobreposição {TILING_CONFIG.overlap:.0%}, "
+              f"região '{TILING_CONFIG.region}'")
     print()
     print("🎮 Controlos:")
     print(f"  {QUIT_KEY.upper()} - Sair")
@@ -183,242 +424,148 @@ def main():
     print(f"  {METRICS_KEY.upper()} - Métricas ON/OFF")
     if BUTTON_CONFIG.enabled:
         print(f"  {SERVICE_MODE_KEY.upper()} - Alternar modo de atendimento (automático/botão)")
+    print(f"  {PROFILE_KEY.upper()} - Gravar profile de {PROFILER_CONFIG.frames} frames ({PROFILER_CONFIG.mode})")
     if EMON_UPLOADER:
         print(f"  🌐 Upload emonCMS a cada {EMON_CONFIG.interval_sec}s (node '{EMON_CONFIG.node}')")
     elif EMON_CONFIG.enabled and not EMON_CONFIG.api_key:
         print("⚠️  emonCMS está ativado mas falta api_key. Upload desativado.")
+    metric_sinks = build_metric_sinks()
+    extra_sinks = [s.name for s in metric_sinks if not isinstance(s, EmonCMSSink)]
+    if extra_sinks:
+        print(f"  📤 Sinks de métricas: {', '.join(extra_sinks)}")
     print()
     print("=" * 70)
     print()
     
     # Estado
-    frame_counter = 0
-    last_detections = []
-    fps = 0
-    total_frames = 0
     start_time = time.time()
-    last_tick_time = start_time
-    # Copiar opções de visualização/direção para variáveis mutáveis locais
-    show_boxes = SHOW_BOXES
-    show_band = SHOW_BAND
-    debug = DEBUG
-    direction = DIRECTION
-    show_eta = SHOW_ETA
-    show_metrics = SHOW_METRICS
     # Estado para contagem por linha
-    tracker = SimpleTracker(match_radius_px=TRACK_MATCH_RADIUS_PX, ttl=TRACK_TTL)
-    entry_count = 0
+    tracker = SimpleTracker(
+        match_radius_px=TRACK_MATCH_RADIUS_PX,
+        ttl=TRACK_TTL,
+        history_len=TRACK_HISTORY_LEN,
+        reentry_sec=TRACK_REENTRY_SEC,
+        reentry_radius_px=TRACK_REENTRY_RADIUS_PX,
+    )
     queue_stats = QueueStats(
         window_sec=METRICS_WINDOW_SEC,
         service_window=BUTTON_SERVICE_WINDOW,
+        wait_window=WAIT_WINDOW,
+        eta_engine=MonteCarloEta(ETA_ENGINE_CONFIG) if ETA_ENGINE_CONFIG.enabled else None,
+    )
+    # Copiar opções de visualização/direção para estado mutável da sessão
+    pipeline = QueuePipeline(
+        MODEL,
+        PipelineConfig(
+            confidence=CONFIDENCE,
+            process_every_n=PROCESS_EVERY_N,
+            line_x_percent=LINE_X_PERCENT,
+            line_band_px=LINE_BAND_PX,
+            line_color=LINE_COLOR,
+            line_thickness=LINE_THICKNESS,
+            avg_service_time_sec=AVG_SERVICE_TIME_SEC,
+        ),
+        tracker,
+        queue_stats,
+        direction=DIRECTION,
+        display=DisplayState(
+            show_boxes=SHOW_BOXES,
+            show_band=SHOW_BAND,
+            debug=DEBUG,
+            show_eta=SHOW_ETA,
+            show_metrics=SHOW_METRICS,
+        ),
+        keys=ControlKeys(
+            quit=QUIT_KEY,
+            toggle_debug=DEBUG_KEY,
+            toggle_boxes=BOXES_KEY,
+            toggle_band=BAND_KEY,
+            toggle_eta=ETA_KEY,
+            toggle_direction=DIR_KEY,
+            toggle_metrics=METRICS_KEY,
+            toggle_service_mode=SERVICE_MODE_KEY,
+            profile=PROFILE_KEY,
+        ),
+        tiler=TiledDetector(TILING_CONFIG) if TILING_CONFIG.enabled else None,
+        motion_gate=MotionGate(MOTION_GATE_CONFIG) if MOTION_GATE_CONFIG.enabled else None,
+        cascade=ModelCascade(CASCADE_CONFIG, CASCADE_MODEL) if CASCADE_MODEL is not None else None,
+    )
+    pipeline.profiler = FrameProfiler(PROFILER_CONFIG, label=lambda: _profile_label(pipeline))
+    if hasattr(signal, 'SIGUSR1'):
+        # kill -USR1 <pid> arma uma captura sem tocar no processo
+        signal.signal(signal.SIGUSR1, lambda *_: pipeline.profiler.request())
+    if RECORDER_CONFIG.enabled:
+        pipeline.clip_recorder = ClipRecorder(RECORDER_CONFIG)
+        pipeline.clip_recorder.start()
+        print(f"🎬 Clips ({', '.join(RECORDER_CONFIG.triggers)}): {RECORDER_CONFIG.pre_roll_sec:.0f}s antes + "
+              f"{RECORDER_CONFIG.post_roll_sec:.0f}s depois, máx. {RECORDER_CONFIG.max_buffer_mb:.0f}MB em memória")
+    if MOTION_GATE_CONFIG.enabled:
+        print(f"💤 Motion gate ({MOTION_GATE_CONFIG.region}): inferência só com movimento, "
+              f"forçada a cada {MOTION_GATE_CONFIG.max_skip_sec:.0f}s")
+    if FEDERATION_CONFIG.enabled:
+        start_federation(pipeline)
+    metrics_hub = MetricsHub(pipeline.build_metrics, metric_sinks)
+    metrics_hub.start()
+    # Alterações ao config.yaml aplicadas em direto (o modelo troca em background)
+    reloader = ConfigReloader(
+        config_path,
+        CONFIG,
+        pipeline,
+        load_model=load_yolo,
+        metrics_hub=metrics_hub,
+        emon_config=EMON_CONFIG,
+        button_config=BUTTON_CONFIG,
+        poll_sec=RUNTIME_CONFIG.config_poll_sec,
     )
-    # Linha vertical (fila esquerda → direita), inicializa com base no tamanho do frame
-    line_a = None  # (x, y)
-    line_b = None  # (x, y)
+    runtime = None
+    if RUNTIME_CONFIG.mode == 'async':
+        runtime = AsyncRuntime(
+            pipeline,
+            cap,
+            WINDOW_NAME,
+            RUNTIME_CONFIG,
+            metrics_hub=metrics_hub,
+            config_path=config_path,
+            on_config_change=reloader.reload,
+        )
     button_events: Queue = Queue()
     button_listener = None
     trigger_key = BUTTON_CONFIG.normalized_key()
-    use_button_mode = BUTTON_CONFIG.enabled and BUTTON_MODE_DEFAULT
-    
-    def log_debug(msg: str):
-        if debug:
-            print(msg)
+    pipeline.use_button_mode = BUTTON_CONFIG.enabled and BUTTON_MODE_DEFAULT
 
     def handle_button_press(key: str):
+        # tecla lida a cada pressão: pode mudar com a recarga do config.yaml
+        trigger_key = BUTTON_CONFIG.normalized_key()
         if not key or not trigger_key:
             return
         if key.strip() == trigger_key:
-            button_events.put(time.time())
-            log_debug("🔘 Botão pressionado")
+            if runtime is not None:
+                runtime.submit_service_event(time.time())
+            else:
+                button_events.put(time.time())
+            pipeline.log_debug("🔘 Botão pressionado")
 
     if BUTTON_CONFIG.enabled:
         try:
             button_listener = ButtonListener(BUTTON_CONFIG, on_key=handle_button_press)
             button_listener.start()
-            mode_label = "botão" if use_button_mode else f"automático ({AVG_SERVICE_TIME_SEC}s)"
+            pipeline.button_available = True
+            mode_label = "botão" if pipeline.use_button_mode else f"automático ({AVG_SERVICE_TIME_SEC}s)"
             print(f"🔘 Botão ativo em {BUTTON_CONFIG.port} (tecla '{trigger_key}') | modo inicial: {mode_label}")
         except RuntimeError as exc:
             print(f"⚠️  Botão desativado: {exc}")
             button_listener = None
-            use_button_mode = False
+            pipeline.use_button_mode = False
+    reloader.button_listener = button_listener
 
     try:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                print("❌ Erro ao ler frame")
-                break
+        if runtime is not None:
+            print("⚡ Runtime asyncio ativo")
+            runtime.button_listener = button_listener
+            runtime.run()
+        else:
+            _run_sync_loop(cap, pipeline, metrics_hub, button_events, button_listener, reloader)
 
-            # Inicializar linha vertical após obter dimensões do frame
-            if line_a is None:
-                H, W = frame.shape[:2]
-                x_mid = max(0, min(W - 1, int(W * LINE_X_PERCENT)))
-                line_a = (x_mid, 0)
-                line_b = (x_mid, H)
-
-            # Atualizar drenagem do modelo simulado por tempo decorrido / botão
-            now = time.time()
-            dt = now - last_tick_time
-            last_tick_time = now
-
-            service_events = []
-            while True:
-                try:
-                    service_events.append(button_events.get_nowait())
-                except Empty:
-                    break
-
-            if service_events and use_button_mode:
-                queue_stats.register_service_events(timestamps=service_events)
-                log_debug(f"✅ {len(service_events)} atendimento(s) via botão")
-
-            if not use_button_mode:
-                queue_stats.tick(dt, AVG_SERVICE_TIME_SEC)
-
-            service_time_for_eta = (
-                queue_stats.estimated_service_time(AVG_SERVICE_TIME_SEC)
-                if use_button_mode
-                else float(AVG_SERVICE_TIME_SEC)
-            )
-            
-            total_frames += 1
-            frame_counter += 1
-            
-            # Calcular FPS
-            elapsed = time.time() - start_time
-            if elapsed > 0:
-                fps = total_frames / elapsed
-            
-            # Fazer detecção a cada N frames (para otimizar performance)
-            if frame_counter >= PROCESS_EVERY_N:
-                frame_counter = 0
-                
-                try:
-                    last_detections = detect_people(MODEL, frame, CONFIDENCE)
-                    num = len(last_detections)
-                    log_debug(f"📊 [Frame {total_frames}] Detectadas {num} pessoa(s) | FPS: {fps:.1f}")
-
-                    # Calcular centroides atuais
-                    curr_centroids = [
-                        ((d['x1'] + d['x2']) // 2, (d['y1'] + d['y2']) // 2)
-                        for d in last_detections
-                    ]
-                    # sem necessidade de guardar centroides para fila simulada
-
-                    # Atualizar tracker e obter pares (track_id, prev_c, curr_c)
-                    matches = tracker.update(curr_centroids)
-
-                    # Contagem com filtro de direção (left -> right) e banda
-                    x_line = line_a[0]
-                    for _, prev_c, curr_c in matches:
-                        # banda em torno da linha
-                        if (abs(prev_c[0] - x_line) > LINE_BAND_PX and
-                                abs(curr_c[0] - x_line) > LINE_BAND_PX):
-                            continue
-                        # cruzamento geométrico
-                        if _crossed_line(prev_c, curr_c, line_a, line_b):
-                            # direção válida
-                            if direction == 'left_to_right' and curr_c[0] > prev_c[0]:
-                                entry_count += 1
-                                queue_stats.on_entry()
-                            elif direction == 'right_to_left' and curr_c[0] < prev_c[0]:
-                                entry_count += 1
-                                queue_stats.on_entry()
-                except Exception as e:
-                    print(f"⚠️  Erro na detecção: {e}")
-                    last_detections = []
-            
-            # Desenhar
-            if last_detections and show_boxes:
-                frame = draw_detections(frame, last_detections)
-
-            # Calcular fila e ETA via modelo simulado
-            queue_len = queue_stats.current_queue_len()
-            eta_sec = queue_stats.eta_for_new(queue_len, service_time_for_eta)
-            
-            # Determinar se o LED está ativo (ETA > 10 minutos = 600 segundos)
-            led_should_be_on = eta_sec > 60
-            
-            # Construir dicionário de métricas (para emonCMS ou logs)
-            metrics_dict = queue_stats.build_metrics(
-                fps=fps,
-                entries=entry_count,
-                direction=direction,
-                people_detected=len(last_detections),
-                avg_service_time_sec=service_time_for_eta,
-                led_alert=led_should_be_on,
-                now=time.time(),
-            )
-
-            frame = draw_info(
-                frame,
-                fps,
-                len(last_detections),
-                entry_count,
-                direction,
-                LINE_BAND_PX,
-                queue_len,
-                eta_sec,
-                debug,
-                show_eta,
-                show_metrics,
-                metrics_dict,
-            )
-
-            if EMON_UPLOADER:
-                EMON_UPLOADER.maybe_send(metrics_dict)
-
-            # Controlar LED vermelho baseado no ETA
-            if button_listener:
-                button_listener.set_led(led_should_be_on)
-
-            # Desenhar linha de contagem (após overlay para ficar visível)
-            if line_a is not None and line_b is not None:
-                cv2.line(frame, line_a, line_b, LINE_COLOR, LINE_THICKNESS)
-                # Desenhar banda de avaliação
-                if show_band:
-                    x_line = line_a[0]
-                    xa = max(0, x_line - LINE_BAND_PX)
-                    xb = min(frame.shape[1] - 1, x_line + LINE_BAND_PX)
-                    band_overlay = frame.copy()
-                    cv2.rectangle(band_overlay, (xa, 0), (xb, frame.shape[0]-1), (255, 255, 0), -1)
-                    cv2.addWeighted(band_overlay, 0.15, frame, 0.85, 0, frame)
-
-            # Mostrar resultado
-            cv2.imshow('Smart Queue - Sistema de Detecção', frame)
-            
-            # Verificar tecla pressionada
-            key = cv2.waitKey(1) & 0xFF
-            key_char = chr(key).lower()
-            if key_char == QUIT_KEY:
-                print("\n🛑 A encerrar...")
-                break
-            elif key_char == DEBUG_KEY:
-                debug = not debug
-                print(f"🐞 Debug: {'ON' if debug else 'OFF'}")
-            elif key_char == BOXES_KEY:
-                show_boxes = not show_boxes
-                print(f"🧰 Boxes: {'ON' if show_boxes else 'OFF'}")
-            elif key_char == BAND_KEY:
-                show_band = not show_band
-                print(f"📏 Banda: {'ON' if show_band else 'OFF'}")
-            elif key_char == ETA_KEY:
-                show_eta = not show_eta
-                print(f"⏱️  ETA: {'ON' if show_eta else 'OFF'}")
-            elif key_char == DIR_KEY:
-                direction = 'right_to_left' if direction == 'left_to_right' else 'left_to_right'
-                print(f"↔️  Direção: {direction}")
-            elif key_char == METRICS_KEY:
-                show_metrics = not show_metrics
-                print(f"📈 Métricas: {'ON' if show_metrics else 'OFF'}")
-            elif key_char == SERVICE_MODE_KEY:
-                if not BUTTON_CONFIG.enabled or button_listener is None:
-                    print("⚠️  Botão físico indisponível para alternar o modo.")
-                else:
-                    use_button_mode = not use_button_mode
-                    label = "botão" if use_button_mode else f"automático ({AVG_SERVICE_TIME_SEC}s)"
-                    print(f"🔄 Atendimento agora usa modo {label}")
-    
     except KeyboardInterrupt:
         print("\n\n⚠️  Interrompido pelo utilizador (Ctrl+C)")
     
@@ -431,14 +578,22 @@ def main():
         cv2.destroyAllWindows()
         if button_listener:
             button_listener.stop()
+        metrics_hub.stop()
+        pipeline.profiler.close()
+        if pipeline.clip_recorder:
+            pipeline.clip_recorder.stop()
+        if pipeline.federation:
+            pipeline.federation.close()
+        if pipeline.site:
+            pipeline.site.stop()
         
         # Estatísticas finais
         elapsed_time = time.time() - start_time
         print()
         print("=" * 70)
         print("📊 Estatísticas da sessão:")
-        print(f"  - Total de frames processados: {total_frames}")
-        print(f"  - FPS médio: {fps:.1f}")
+        print(f"  - Total de frames processados: {pipeline.total_frames}")
+        print(f"  - FPS médio: {pipeline.fps:.1f}")
         print(f"  - Tempo total: {elapsed_time:.1f}s")
         print("=" * 70)
         print("✅ Sistema encerrado com sucesso!")
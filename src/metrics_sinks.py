@@ -0,0 +1,303 @@
+"""Lazy metrics snapshots fanned out to pluggable sinks.
+
+The frame loop only calls MetricsHub.poll(): the metrics dict is built (and
+serialized to JSON) at most once per poll, and only when some sink is due or
+the HUD asked for it. Each sink has its own rate limit, batch size and a
+bounded queue drained by a daemon thread; when a sink falls behind the oldest
+snapshots are dropped, so a slow output never stalls the video loop.
+
+Sinks: emonCMS, local JSONL/CSV file, UDP datagrams ("topic payload", for a
+local MQTT-style broker/bridge) and stdout.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import socket
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from queue import Empty, Full, Queue
+from typing import Callable, Dict, List, Optional
+
+from emoncms_client import EmonCMSUploader
+
+
+class MetricsSnapshot:
+    """Métricas de um instante; o JSON é serializado uma única vez."""
+    __slots__ = ('ts', 'metrics', '_payload')
+
+    def __init__(self, ts: float, metrics: Dict):
+        self.ts = ts
+        self.metrics = metrics
+        self._payload: Optional[str] = None
+
+    @property
+    def payload(self) -> str:
+        if self._payload is None:
+            self._payload = json.dumps(self.metrics, separators=(",", ":"))
+        return self._payload
+
+
+@dataclass
+class SinkConfig:
+    interval_sec: float = 5.0   # intervalo mínimo entre snapshots aceites
+    batch_size: int = 1         # nº máximo de snapshots por escrita
+    flush_sec: float = 0.0      # espera máxima para completar um batch
+    queue_size: int = 64        # snapshots pendentes antes de descartar os mais antigos
+
+
+class MetricsSink(ABC):
+    name = "sink"
+
+    def __init__(self, cfg: SinkConfig):
+        self.cfg = cfg
+        self.dropped = 0
+        self._next_due = 0.0
+        self._queue: Queue = Queue(maxsize=max(1, int(cfg.queue_size)))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_error_msg: Optional[str] = None
+
+    # ------------------------------------------------------------------
+    # Lado do frame loop (nunca bloqueia)
+    # ------------------------------------------------------------------
+    def due(self, now: float) -> bool:
+        return now >= self._next_due
+
+    def next_due(self) -> float:
+        return self._next_due
+
+    def offer(self, snapshot: MetricsSnapshot, now: float):
+        self._next_due = now + max(0.1, self.cfg.interval_sec)
+        try:
+            self._queue.put_nowait(snapshot)
+        except Full:
+            # backpressure: descartar o mais antigo e manter o mais recente
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+            except Empty:
+                pass
+            try:
+                self._queue.put_nowait(snapshot)
+            except Full:
+                self.dropped += 1
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+    def start(self):
+        self.open()
+        self._thread = threading.Thread(target=self._run, name=f"sink-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        self.close()
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=0.25)
+            except Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            batch = [first]
+            deadline = time.monotonic() + max(0.0, self.cfg.flush_sec)
+            while len(batch) < max(1, self.cfg.batch_size):
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0 or self._stop.is_set():
+                        batch.append(self._queue.get_nowait())
+                    else:
+                        batch.append(self._queue.get(timeout=remaining))
+                except Empty:
+                    break
+            try:
+                self.write_batch(batch)
+                self._last_error_msg = None
+            except Exception as exc:
+                msg = f"Sink '{self.name}' falhou: {exc}"
+                # só loga quando mensagem muda para evitar spam
+                if msg != self._last_error_msg:
+                    print(f"⚠️  {msg}")
+                    self._last_error_msg = msg
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def write_batch(self, batch: List[MetricsSnapshot]):
+        """Escreve um batch de snapshots (corre na thread do sink)."""
+
+
+class EmonCMSSink(MetricsSink):
+    name = "emoncms"
+
+    def __init__(self, uploader: EmonCMSUploader, cfg: SinkConfig):
+        super().__init__(cfg)
+        self.uploader = uploader
+
+    def write_batch(self, batch: List[MetricsSnapshot]):
+        for snap in batch:
+            self.uploader.send_payload(snap.payload, ts=snap.ts)
+
+
+class FileSink(MetricsSink):
+    """
+    JSONL (uma linha JSON por snapshot) ou CSV com cabeçalho. Em CSV, quando
+    aparecem campos novos (gate_*, cascade_*, site_*, ativados p.ex. por
+    recarga da config) a escrita passa para um ficheiro novo com o cabeçalho
+    completo, em vez de os descartar.
+    """
+    name = "file"
+
+    def __init__(self, path: Path, cfg: SinkConfig, fmt: str = "jsonl"):
+        super().__init__(cfg)
+        self.path = Path(path)
+        self.fmt = fmt.lower()
+        self.current_path = self.path
+        self._fh = None
+        self._csv_writer: Optional[csv.DictWriter] = None
+        self._csv_fields: Optional[List[str]] = None  # cabeçalho do ficheiro atual
+
+    def open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.current_path = self.path
+        self._csv_writer = None
+        self._csv_fields = None
+        if self.fmt == "csv" and self.path.exists() and self.path.stat().st_size > 0:
+            with open(self.path, "r", newline="", encoding="utf-8") as f:
+                self._csv_fields = next(csv.reader(f), None)
+        self._fh = open(self.path, "a", newline="", encoding="utf-8")
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def write_batch(self, batch: List[MetricsSnapshot]):
+        assert self._fh is not None
+        if self.fmt == "csv":
+            for snap in batch:
+                row = {"ts": round(snap.ts, 3), **snap.metrics}
+                fields = self._csv_fields
+                if fields is not None and not set(row).issubset(fields):
+                    self._rotate_csv()
+                    fields = None
+                if fields is None:
+                    self._csv_fields = list(row.keys())
+                    self._csv_writer = csv.DictWriter(self._fh, fieldnames=self._csv_fields)
+                    self._csv_writer.writeheader()
+                elif self._csv_writer is None:
+                    self._csv_writer = csv.DictWriter(self._fh, fieldnames=fields)
+                self._csv_writer.writerow(row)
+        else:
+            self._fh.write("".join(
+                f'{{"ts":{snap.ts:.3f},"metrics":{snap.payload}}}\n' for snap in batch
+            ))
+        self._fh.flush()
+
+    def _rotate_csv(self):
+        """Campos novos: continua num ficheiro novo (<nome>-<data>.csv)."""
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = self.path.with_name(f"{self.path.stem}-{stamp}{self.path.suffix}")
+        n = 1
+        while path.exists():
+            path = self.path.with_name(f"{self.path.stem}-{stamp}-{n}{self.path.suffix}")
+            n += 1
+        self.close()
+        self._fh = open(path, "a", newline="", encoding="utf-8")
+        self.current_path = path
+        self._csv_writer = None
+        self._csv_fields = None
+        print(f"ℹ️  Métricas CSV com novos campos: a escrever em {path.name}")
+
+
+class UdpSink(MetricsSink):
+    """Datagramas "<topic> <json>" para um broker/bridge local (estilo MQTT)."""
+    name = "udp"
+
+    def __init__(self, host: str, port: int, cfg: SinkConfig, topic: str = "smart-queue/metrics"):
+        super().__init__(cfg)
+        self.addr = (host, int(port))
+        self.topic = topic
+        self._sock: Optional[socket.socket] = None
+
+    def open(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def write_batch(self, batch: List[MetricsSnapshot]):
+        assert self._sock is not None
+        prefix = f"{self.topic} ".encode("utf-8") if self.topic else b""
+        for snap in batch:
+            self._sock.sendto(prefix + snap.payload.encode("utf-8"), self.addr)
+
+
+class StdoutSink(MetricsSink):
+    name = "stdout"
+
+    def write_batch(self, batch: List[MetricsSnapshot]):
+        sys.stdout.write("".join(f"📈 {snap.payload}\n" for snap in batch))
+        sys.stdout.flush()
+
+
+class MetricsHub:
+    """Constrói snapshots sob pedido e distribui-os pelos sinks devidos."""
+
+    def __init__(self, build: Callable[[float], Dict], sinks: Optional[List[MetricsSink]] = None):
+        self._build = build
+        self.sinks: List[MetricsSink] = list(sinks or [])
+        self.snapshots_built = 0
+
+    def start(self):
+        for sink in self.sinks:
+            sink.start()
+
+    def stop(self):
+        for sink in self.sinks:
+            sink.stop()
+
+    def add_sink(self, sink: MetricsSink):
+        """Arranca e regista um sink com o hub já a correr (recarga de configuração)."""
+        sink.start()
+        self.sinks = self.sinks + [sink]
+
+    def next_due(self) -> float:
+        """Próximo instante em que algum sink aceita um snapshot (inf sem sinks)."""
+        return min((s.next_due() for s in self.sinks), default=float("inf"))
+
+    def poll(self, now: Optional[float] = None, need: bool = False) -> Optional[MetricsSnapshot]:
+        """
+        Build one snapshot if a sink is due or `need` is set (e.g. HUD on),
+        hand it to every due sink and return it; otherwise return None.
+        """
+        if now is None:
+            now = time.time()
+        due = [s for s in self.sinks if s.due(now)]
+        if not due and not need:
+            return None
+        snapshot = MetricsSnapshot(now, self._build(now))
+        self.snapshots_built += 1
+        for sink in due:
+            sink.offer(snapshot, now)
+        return snapshot
+
+    def dropped(self) -> Dict[str, int]:
+        return {s.name: s.dropped for s in self.sinks}
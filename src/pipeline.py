@@ -0,0 +1,386 @@
+"""Per-session counting pipeline shared by the sync and asyncio runtimes.
+
+Holds the state that used to live as locals in main(): tracker, queue model,
+entry counter, counting line and the HUD toggles. The runtimes only decide
+*when* each step runs (every frame, in an executor, on an event, ...).
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+
+from cascade import ModelCascade
+from clip_recorder import ClipRecorder
+from counting import crossed_line
+from federation import FederationAggregator, FederationPublisher
+from motion_gate import MotionGate
+from profiler import FrameProfiler
+from queue_metrics import QueueStats
+from tracker import SimpleTracker
+from vision import TiledDetector, detect_people, draw_detections, draw_info
+
+# LED vermelho acende quando o ETA passa deste valor (segundos)
+LED_ETA_THRESHOLD_SEC = 60
+
+
+@dataclass
+class PipelineConfig:
+    confidence: float = 0.5
+    process_every_n: int = 3
+    line_x_percent: float = 0.5
+    line_band_px: int = 100
+    line_color: Tuple[int, int, int] = (0, 0, 255)
+    line_thickness: int = 2
+    avg_service_time_sec: float = 20.0
+
+
+@dataclass
+class ControlKeys:
+    quit: str = 'q'
+    toggle_debug: str = 'd'
+    toggle_boxes: str = 'o'
+    toggle_band: str = 'b'
+    toggle_eta: str = 'e'
+    toggle_direction: str = 'r'
+    toggle_metrics: str = 'm'
+    toggle_service_mode: str = 't'
+    profile: str = 'p'
+
+
+@dataclass
+class DisplayState:
+    show_boxes: bool = True
+    show_band: bool = False
+    debug: bool = False
+    show_eta: bool = False
+    show_metrics: bool = False
+
+
+class QueuePipeline:
+    def __init__(
+        self,
+        model,
+        cfg: PipelineConfig,
+        tracker: SimpleTracker,
+        queue_stats: QueueStats,
+        direction: str = 'left_to_right',
+        display: Optional[DisplayState] = None,
+        keys: Optional[ControlKeys] = None,
+        tiler: Optional[TiledDetector] = None,
+        motion_gate: Optional[MotionGate] = None,
+        cascade: Optional[ModelCascade] = None,
+    ):
+        self.model = model
+        self.cfg = cfg
+        self.tracker = tracker
+        self.queue_stats = queue_stats
+        self.direction = direction
+        self.display = display or DisplayState()
+        self.keys = keys or ControlKeys()
+        self.tiler = tiler
+        self.motion_gate = motion_gate
+        self.cascade = cascade
+        self.profiler: Optional[FrameProfiler] = None
+        self.clip_recorder: Optional[ClipRecorder] = None
+        self.federation: Optional[FederationPublisher] = None
+        self.site: Optional[FederationAggregator] = None
+        self.led_alert = False
+        # modo de atendimento: botão físico (True) ou tempo médio simulado (False)
+        self.use_button_mode = False
+        self.button_available = False
+
+        self.entry_count = 0
+        self.last_detections: List[Dict[str, Any]] = []
+        self.fps = 0.0
+        self.total_frames = 0
+        self.frame_counter = 0
+        self.start_time = time.time()
+        self.last_tick_time = self.start_time
+        # Linha vertical (fila esquerda → direita), inicializa com base no tamanho do frame
+        self.line_a: Optional[Tuple[int, int]] = None
+        self.line_b: Optional[Tuple[int, int]] = None
+
+    # ------------------------------------------------------------------
+    def log_debug(self, msg: str):
+        if self.display.debug:
+            print(msg)
+
+    def ensure_line(self, frame):
+        # Inicializar linha vertical após obter dimensões do frame
+        if self.line_a is None:
+            H, W = frame.shape[:2]
+            x_mid = max(0, min(W - 1, int(W * self.cfg.line_x_percent)))
+            self.line_a = (x_mid, 0)
+            self.line_b = (x_mid, H)
+
+    def count_frame(self, now: float):
+        self.total_frames += 1
+        self.frame_counter += 1
+        elapsed = now - self.start_time
+        if elapsed > 0:
+            self.fps = self.total_frames / elapsed
+
+    def should_infer(self, frame=None, now: Optional[float] = None) -> bool:
+        """True a cada N frames, se o motion gate (quando ativo) vir movimento."""
+        if self.frame_counter < self.cfg.process_every_n:
+            return False
+        self.frame_counter = 0
+        gate = self.motion_gate
+        if gate is None or not gate.cfg.enabled or frame is None:
+            return True
+        run = gate.check(frame, time.time() if now is None else now, self.gate_region(frame))
+        if not run:
+            self.log_debug(f"💤 [Frame {self.total_frames}] Sem movimento, inferência saltada")
+        return run
+
+    def gate_region(self, frame) -> Optional[Tuple[int, int, int, int]]:
+        """Região vigiada pelo motion gate: banda de contagem (com margem) ou frame inteiro."""
+        if self.motion_gate is None or self.motion_gate.cfg.region != 'band':
+            return None
+        return self.band_rect(frame, self.cfg.line_band_px + self.motion_gate.cfg.band_margin_px)
+
+    # ------------------------------------------------------------------
+    # Fila / atendimento
+    # ------------------------------------------------------------------
+    def register_service_events(self, timestamps: Sequence[float]):
+        if timestamps and self.use_button_mode:
+            self.queue_stats.register_service_events(timestamps=timestamps)
+            self.log_debug(f"✅ {len(timestamps)} atendimento(s) via botão")
+
+    def advance_clock(self, now: float):
+        """Drena a fila simulada pelo tempo decorrido (modo automático)."""
+        dt = now - self.last_tick_time
+        self.last_tick_time = now
+        if not self.use_button_mode:
+            self.queue_stats.tick(dt, self.cfg.avg_service_time_sec)
+
+    def service_time_for_eta(self) -> float:
+        if self.use_button_mode:
+            return self.queue_stats.estimated_service_time(self.cfg.avg_service_time_sec)
+        return float(self.cfg.avg_service_time_sec)
+
+    def queue_status(self) -> Tuple[int, int, bool]:
+        """(queue_len, eta_sec, led_alert) via modelo simulado."""
+        queue_len = self.queue_stats.current_queue_len()
+        eta_sec = self.queue_stats.eta_for_new(queue_len, self.service_time_for_eta())
+        return queue_len, eta_sec, eta_sec > LED_ETA_THRESHOLD_SEC
+
+    def update_alert(self, now: float) -> bool:
+        """Recalcula o alerta do LED; dispara um clip quando acende."""
+        _, _, led_alert = self.queue_status()
+        if led_alert and not self.led_alert and self.clip_recorder is not None:
+            self.clip_recorder.trigger('led', now)
+        self.led_alert = led_alert
+        return led_alert
+
+    def publish_federation(self, now: float):
+        """Envia o estado local ao aggregator (limitado pelo próprio publisher)."""
+        if self.federation is None:
+            return
+        qs = self.queue_stats
+        self.federation.maybe_publish(
+            now,
+            self.entry_count,
+            qs.services_total,
+            qs.current_queue_len(),
+            qs.arrival_rate_per_min(now),
+            self.service_time_for_eta(),
+        )
+
+    def build_metrics(self, now: Optional[float] = None) -> Dict:
+        if now is None:
+            now = time.time()
+        _, _, led_alert = self.queue_status()
+        metrics = self.queue_stats.build_metrics(
+            fps=self.fps,
+            entries=self.entry_count,
+            direction=self.direction,
+            people_detected=len(self.last_detections),
+            avg_service_time_sec=self.service_time_for_eta(),
+            led_alert=led_alert,
+            now=now,
+            service_elapsed_sec=self.queue_stats.in_service_elapsed(now, self.use_button_mode),
+        )
+        if self.motion_gate is not None and self.motion_gate.cfg.enabled:
+            metrics.update(self.motion_gate.metrics())
+        if self.cascade is not None and self.cascade.cfg.enabled:
+            metrics.update(self.cascade.metrics(now))
+        if self.site is not None:
+            site = self.site.site_state(now)
+            metrics["site_nodes_online"] = site["nodes_online"]
+            metrics["site_queue_len"] = site["queue_len"]
+            metrics["site_eta_sec"] = site["eta_sec"]
+        return metrics
+
+    # ------------------------------------------------------------------
+    # Detecção / contagem
+    # ------------------------------------------------------------------
+    def infer(self, frame) -> List[Dict[str, Any]]:
+        """Só lê o modelo e o frame: seguro para correr num executor."""
+        cascade = self.cascade
+        if cascade is not None and cascade.cfg.enabled:
+            return cascade.detect(self._detect_fast, frame, self.cfg.confidence, time.time(),
+                                  self.band_rect(frame, self.cfg.line_band_px))
+        return self._detect_fast(frame, self.cfg.confidence)
+
+    def _detect_fast(self, frame, conf: float) -> List[Dict[str, Any]]:
+        tiler = self.tiler
+        if tiler is not None and tiler.cfg.enabled:
+            return tiler.detect(self.model, frame, conf, self.tiling_region(frame))
+        return detect_people(self.model, frame, conf)
+
+    def band_rect(self, frame, half: int) -> Optional[Tuple[int, int, int, int]]:
+        """Retângulo de +-half px em torno da linha (None antes de a linha existir)."""
+        if self.line_a is None:
+            return None
+        H, W = frame.shape[:2]
+        x_line = self.line_a[0]
+        return (max(0, x_line - half), 0, min(W, x_line + half), H)
+
+    def tiling_region(self, frame) -> Optional[Tuple[int, int, int, int]]:
+        """Região a dividir em tiles: frame inteiro ou banda de contagem."""
+        if self.tiler is None or self.tiler.cfg.region != 'band':
+            return None
+        # banda nunca mais estreita que um tile, para não desperdiçar o batch
+        return self.band_rect(frame, max(self.cfg.line_band_px, self.tiler.cfg.tile_size // 2))
+
+    def apply_detections(self, detections: List[Dict[str, Any]], now: float):
+        self.last_detections = detections
+        self.log_debug(
+            f"📊 [Frame {self.total_frames}] Detectadas {len(detections)} pessoa(s) | FPS: {self.fps:.1f}"
+        )
+
+        # Calcular centroides atuais
+        curr_centroids = [
+            ((d['x1'] + d['x2']) // 2, (d['y1'] + d['y2']) // 2)
+            for d in detections
+        ]
+
+        # Atualizar tracker e obter pares (track_id, prev_c, curr_c)
+        matches = self.tracker.update(curr_centroids, now)
+        if self.line_a is None or self.line_b is None:
+            return
+
+        # Contagem com filtro de direção (left -> right) e banda
+        x_line = self.line_a[0]
+        band = self.cfg.line_band_px
+        for tid, prev_c, curr_c in matches:
+            # banda em torno da linha
+            if abs(prev_c[0] - x_line) > band and abs(curr_c[0] - x_line) > band:
+                continue
+            # cruzamento geométrico
+            if crossed_line(prev_c, curr_c, self.line_a, self.line_b):
+                # direção válida
+                if self.direction == 'left_to_right' and curr_c[0] > prev_c[0]:
+                    self._on_entry(tid, now)
+                elif self.direction == 'right_to_left' and curr_c[0] < prev_c[0]:
+                    self._on_entry(tid, now)
+
+        # Tracks que deixaram de ser vistos junto à linha (gatilho da cascata)
+        if self.cascade is not None and self.cascade.cfg.enabled:
+            lost = sum(1 for _, c in self.tracker.last_lost if abs(c[0] - x_line) <= band)
+            if lost:
+                self.cascade.report_track_loss(lost, now)
+
+        # Tempos de espera medidos (tracks que entraram e saíram de cena)
+        for wait_sec in self.tracker.pop_completed_dwells():
+            self.queue_stats.record_wait(wait_sec)
+            self.log_debug(f"⏳ Espera medida: {wait_sec:.1f}s")
+
+    def _on_entry(self, track_id: int, now: float):
+        self.entry_count += 1
+        self.queue_stats.on_entry(now)
+        self.tracker.mark_entered(track_id, now)
+        if self.clip_recorder is not None:
+            self.clip_recorder.trigger('entry', now)
+
+    def process_frame(self, frame, now: float):
+        """Deteção + contagem síncrona (erros de deteção não param o loop)."""
+        try:
+            self.apply_detections(self.infer(frame), now)
+        except Exception as e:
+            print(f"⚠️  Erro na detecção: {e}")
+            self.last_detections = []
+
+    # ------------------------------------------------------------------
+    # Desenho / teclado
+    # ------------------------------------------------------------------
+    def render(self, frame, metrics: Optional[Dict] = None):
+        disp = self.display
+        if self.last_detections and disp.show_boxes:
+            frame = draw_detections(frame, self.last_detections)
+
+        queue_len, eta_sec, _ = self.queue_status()
+        frame = draw_info(
+            frame,
+            self.fps,
+            len(self.last_detections),
+            self.entry_count,
+            self.direction,
+            self.cfg.line_band_px,
+            queue_len,
+            eta_sec,
+            disp.debug,
+            disp.show_eta,
+            disp.show_metrics,
+            metrics,
+        )
+
+        # Desenhar linha de contagem (após overlay para ficar visível)
+        if self.line_a is not None and self.line_b is not None:
+            cv2.line(frame, self.line_a, self.line_b, self.cfg.line_color, self.cfg.line_thickness)
+            # Desenhar banda de avaliação
+            if disp.show_band:
+                x_line = self.line_a[0]
+                band = self.cfg.line_band_px
+                xa = max(0, x_line - band)
+                xb = min(frame.shape[1] - 1, x_line + band)
+                band_overlay = frame.copy()
+                cv2.rectangle(band_overlay, (xa, 0), (xb, frame.shape[0]-1), (255, 255, 0), -1)
+                cv2.addWeighted(band_overlay, 0.15, frame, 0.85, 0, frame)
+        return frame
+
+    def record(self, frame, now: float):
+        """Entrega o frame já anotado ao gravador de clips (não bloqueia)."""
+        if self.clip_recorder is not None:
+            self.clip_recorder.submit(frame, now)
+
+    def handle_key(self, key_char: str) -> bool:
+        """Processa uma tecla; devolve False quando o utilizador pede para sair."""
+        keys = self.keys
+        disp = self.display
+        if key_char == keys.quit:
+            print("\n🛑 A encerrar...")
+            return False
+        elif key_char == keys.toggle_debug:
+            disp.debug = not disp.debug
+            print(f"🐞 Debug: {'ON' if disp.debug else 'OFF'}")
+        elif key_char == keys.toggle_boxes:
+            disp.show_boxes = not disp.show_boxes
+            print(f"🧰 Boxes: {'ON' if disp.show_boxes else 'OFF'}")
+        elif key_char == keys.toggle_band:
+            disp.show_band = not disp.show_band
+            print(f"📏 Banda: {'ON' if disp.show_band else 'OFF'}")
+        elif key_char == keys.toggle_eta:
+            disp.show_eta = not disp.show_eta
+            print(f"⏱️  ETA: {'ON' if disp.show_eta else 'OFF'}")
+        elif key_char == keys.toggle_direction:
+            self.direction = 'right_to_left' if self.direction == 'left_to_right' else 'left_to_right'
+            print(f"↔️  Direção: {self.direction}")
+        elif key_char == keys.toggle_metrics:
+            disp.show_metrics = not disp.show_metrics
+            print(f"📈 Métricas: {'ON' if disp.show_metrics else 'OFF'}")
+        elif key_char == keys.toggle_service_mode:
+            if not self.button_available:
+                print("⚠️  Botão físico indisponível para alternar o modo.")
+            else:
+                self.use_button_mode = not self.use_button_mode
+                label = "botão" if self.use_button_mode else f"automático ({self.cfg.avg_service_time_sec}s)"
+                print(f"🔄 Atendimento agora usa modo {label}")
+        elif key_char == keys.profile and self.profiler is not None:
+            self.profiler.request()
+        return True
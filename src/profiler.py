@@ -0,0 +1,167 @@
+"""On-demand profiler for the live pipeline.
+
+Armed at runtime (control key, SIGUSR1 or the async HTTP endpoint), it
+records a fixed number of frames and saves the result under data/profiles/,
+next to a JSON file with the configuration in effect:
+
+- ``cprofile`` (deterministic): ``.prof`` file for pstats/snakeviz/flameprof.
+  Only sees the thread running the frame loop (in async mode inference runs
+  in an executor thread, so prefer ``sampling`` there).
+- ``sampling``: samples the stacks of every thread each ``interval_ms`` and
+  writes collapsed stacks (``.folded``) for flamegraph.pl/speedscope.
+
+When idle the only cost is one attribute check per frame in on_frame().
+"""
+
+from __future__ import annotations
+
+import cProfile
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+
+@dataclass
+class ProfilerConfig:
+    mode: str = "cprofile"          # 'cprofile' (determinístico) ou 'sampling'
+    frames: int = 300               # nº de frames a gravar por captura
+    interval_ms: float = 5.0        # (sampling) intervalo entre amostras
+    output_dir: Path = Path("data/profiles")
+
+
+class _StackSampler:
+    """Samples all thread stacks from a daemon thread (collapsed-stack counts)."""
+
+    def __init__(self, interval_sec: float):
+        self.interval_sec = max(0.001, interval_sec)
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval_sec):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for tid, frame in sys._current_frames().items():
+                if tid == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(tid, str(tid)))
+                self.counts[";".join(reversed(stack))] += 1
+
+
+class FrameProfiler:
+    def __init__(self, cfg: ProfilerConfig, label: Optional[Callable[[], Dict]] = None):
+        self.cfg = cfg
+        self._label = label
+        self._requested_frames = 0  # escrito por outras threads/sinais; lido em on_frame()
+        self._active = False
+        self._frames_left = 0
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[_StackSampler] = None
+        self._started_at = 0.0
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    def request(self, frames: Optional[int] = None):
+        """Arma uma captura; começa no próximo frame (seguro a partir de qualquer thread)."""
+        if self._active:
+            print("ℹ️  Profiler já está a gravar.")
+            return
+        self._requested_frames = max(1, int(frames or self.cfg.frames))
+
+    def on_frame(self):
+        """Chamado uma vez por frame pelo loop principal."""
+        if not (self._requested_frames or self._active):
+            return
+        if not self._active:
+            self._start(self._requested_frames)
+            self._requested_frames = 0
+            return
+        self._frames_left -= 1
+        if self._frames_left <= 0:
+            self._stop()
+
+    def close(self):
+        """Termina uma captura em curso e grava-a já (à saída do programa)."""
+        if self._active:
+            self._stop(background=False)
+
+    # ------------------------------------------------------------------
+    def _start(self, frames: int):
+        self._frames_left = frames
+        self._started_at = time.time()
+        if self.cfg.mode == "sampling":
+            self._sampler = _StackSampler(self.cfg.interval_ms / 1000.0)
+            self._sampler.start()
+        else:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._active = True
+        print(f"🔬 Profiler ({self.cfg.mode}) a gravar {frames} frame(s)...")
+
+    def _stop(self, background: bool = True):
+        self._active = False
+        elapsed = time.time() - self._started_at
+        profile, sampler = self._profile, self._sampler
+        self._profile = self._sampler = None
+        if profile is not None:
+            profile.disable()
+        if sampler is not None:
+            sampler.stop()
+        label = self._label() if self._label else {}
+        args = (profile, sampler, label, self._started_at, elapsed)
+        if not background:
+            self._save(*args)
+            return
+        # gravar em background para não parar o loop de vídeo
+        threading.Thread(target=self._save, args=args, name="profiler-save", daemon=True).start()
+
+    def _save(self, profile: Optional[cProfile.Profile], sampler: Optional[_StackSampler],
+              label: Dict, started_at: float, elapsed: float):
+        out_dir = Path(self.cfg.output_dir)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(started_at))
+        base = out_dir / f"profile-{stamp}-{self.cfg.mode}"
+        try:
+            out_dir.mkdir(parents=True, exist_ok=True)
+            if profile is not None:
+                stats_path = base.with_suffix(".prof")
+                profile.dump_stats(str(stats_path))
+            else:
+                assert sampler is not None
+                stats_path = base.with_suffix(".folded")
+                with open(stats_path, "w", encoding="utf-8") as f:
+                    for stack, count in sampler.counts.most_common():
+                        f.write(f"{stack} {count}\n")
+            meta = {
+                "mode": self.cfg.mode,
+                "started_at": started_at,
+                "duration_sec": round(elapsed, 3),
+                "stats_file": stats_path.name,
+                "config": label,
+            }
+            with open(base.with_suffix(".json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=2, default=str)
+            print(f"🔬 Profile gravado em {stats_path} ({elapsed:.1f}s)")
+        except OSError as exc:
+            print(f"⚠️  Não foi possível gravar o profile: {exc}")
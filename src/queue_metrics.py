@@ -1,7 +1,10 @@
-from typing import Tuple, Dict, Optional, Sequence
+from typing import Tuple, Dict, Optional, Sequence, TYPE_CHECKING
 from collections import deque
 import time
 
+if TYPE_CHECKING:  # pragma: no cover
+    from eta_engine import MonteCarloEta
+
 
 Point = Tuple[int, int]
 
@@ -12,13 +15,20 @@ O modelo atual usa apenas fila simulada interna em QueueStats.
 
 
 class QueueStats:
-    def __init__(self, window_sec: int = 120, service_window: int = 5):
+    def __init__(self, window_sec: int = 120, service_window: int = 5, wait_window: int = 50,
+                 eta_engine: Optional["MonteCarloEta"] = None):
         self.window_sec = max(1, int(window_sec))
         self._arrivals = deque()  # timestamps (seconds)
         self.queue_estimate: int = 0
         self._service_accum: float = 0.0
         self._service_durations = deque(maxlen=max(1, int(service_window)))
         self._last_service_ts: Optional[float] = None
+        self._service_start_ts: Optional[float] = None  # fila passou de vazia a 1 pessoa
+        self._durations_version = 0  # muda a cada duração observada (cache do ETA)
+        self.eta_engine = eta_engine
+        self.services_total: int = 0  # atendimentos (botão ou simulados)
+        # tempos de espera medidos pelo tracker (entrada na fila -> saída de cena)
+        self._wait_times = deque(maxlen=max(1, int(wait_window)))
 
     def _prune(self, now: Optional[float] = None):
         if now is None:
@@ -32,6 +42,9 @@ class QueueStats:
             ts = time.time()
         self._arrivals.append(ts)
         self._prune(ts)
+        if self.queue_estimate == 0:
+            # fila estava vazia: o próximo atendimento começa agora, não no último botão
+            self._service_start_ts = ts
         self.queue_estimate += 1
 
     def tick(self, dt: float, avg_service_time_sec: float):
@@ -40,19 +53,23 @@ class QueueStats:
         self._service_accum += dt
         events = int(self._service_accum // float(avg_service_time_sec))
         if events > 0:
+            self.services_total += min(events, self.queue_estimate)
             self.queue_estimate = max(0, self.queue_estimate - events)
             self._service_accum -= events * float(avg_service_time_sec)
 
     def register_service_event(self, ts: Optional[float] = None):
         if ts is None:
             ts = time.time()
+        self.services_total += 1
         if self.queue_estimate > 0:
             self.queue_estimate = max(0, self.queue_estimate - 1)
             if self.queue_estimate == 0:
                 self._service_accum = 0.0
-        if self._last_service_ts is not None:
-            duration = max(0.01, ts - self._last_service_ts)
+        start = self._service_origin()
+        if start is not None:
+            duration = max(0.01, ts - start)
             self._service_durations.append(duration)
+            self._durations_version += 1
         self._last_service_ts = ts
 
     def register_service_events(
@@ -67,6 +84,28 @@ class QueueStats:
         for _ in range(max(0, int(count))):
             self.register_service_event()
 
+    def resize_windows(self, service_window: Optional[int] = None, wait_window: Optional[int] = None):
+        """Altera o tamanho das janelas mantendo as observações mais recentes."""
+        if service_window is not None:
+            self._service_durations = deque(self._service_durations, maxlen=max(1, int(service_window)))
+            self._durations_version += 1
+        if wait_window is not None:
+            self._wait_times = deque(self._wait_times, maxlen=max(1, int(wait_window)))
+
+    def record_wait(self, wait_sec: float):
+        if wait_sec is None or wait_sec < 0:
+            return
+        self._wait_times.append(float(wait_sec))
+
+    def measured_wait_stats(self) -> Tuple[float, float]:
+        """(média, p90) dos últimos tempos de espera medidos; (0, 0) sem dados."""
+        n = len(self._wait_times)
+        if n == 0:
+            return 0.0, 0.0
+        ordered = sorted(self._wait_times)
+        p90 = ordered[min(n - 1, int(round(0.9 * (n - 1))))]
+        return sum(ordered) / n, p90
+
     def current_queue_len(self) -> int:
         return int(self.queue_estimate)
 
@@ -95,6 +134,33 @@ class QueueStats:
             return max(0.01, sum(self._service_durations) / len(self._service_durations))
         return float(fallback)
 
+    def _service_origin(self) -> Optional[float]:
+        """Início do atendimento em curso: último botão, ou a chegada se a fila esteve vazia."""
+        if self._last_service_ts is None:
+            return None
+        if self._service_start_ts is None:
+            return self._last_service_ts
+        return max(self._last_service_ts, self._service_start_ts)
+
+    def in_service_elapsed(self, now: float, observed: bool) -> float:
+        """Há quanto tempo dura o atendimento em curso (botão ou modelo simulado)."""
+        if observed:
+            start = self._service_origin()
+            if start is None:
+                return 0.0
+            return max(0.0, now - start)
+        return self._service_accum
+
+    def eta_percentiles(self, queue_len: int, avg_service_time_sec: float,
+                        elapsed_sec: float = 0.0) -> Dict[int, int]:
+        """ETA por percentil (Monte Carlo); vazio sem motor configurado."""
+        if self.eta_engine is None:
+            return {}
+        return self.eta_engine.percentiles(
+            queue_len, self._service_durations, self._durations_version,
+            avg_service_time_sec, elapsed_sec,
+        )
+
     def build_metrics(
         self,
         fps: float,
@@ -104,9 +170,11 @@ class QueueStats:
         avg_service_time_sec: float,
         led_alert: bool = False,
         now: Optional[float] = None,
+        service_elapsed_sec: float = 0.0,
     ) -> Dict:
         """Retorna apenas o conjunto simplificado de métricas pedido.
         Campos: fps, direction, queue_len, entries, people_detected, eta_sec,
+        eta_pNN_sec (com motor Monte Carlo), wait_avg_sec, wait_p90_sec,
         arrival_rate_min, service_rate_min, service_time_sec, led_alert
         """
         if now is None:
@@ -117,6 +185,8 @@ class QueueStats:
         dir_code = 1 if direction == "left_to_right" else -1
         arr_rate = self.arrival_rate_per_min(now)
         svc_rate = self.service_rate_per_min(avg_service_time_sec)
+        wait_avg, wait_p90 = self.measured_wait_stats()
+        eta_pct = self.eta_percentiles(q_len, avg_service_time_sec, service_elapsed_sec)
         return {
             "fps": round(float(fps), 2),
             "direction": dir_code,
@@ -124,6 +194,9 @@ class QueueStats:
             "entries": int(entries),
             "people_detected": int(people_detected),
             "eta_sec": int(eta_sec),
+            **{f"eta_p{p}_sec": v for p, v in eta_pct.items()},
+            "wait_avg_sec": round(wait_avg, 1),
+            "wait_p90_sec": round(wait_p90, 1),
             "arrival_rate_min": round(arr_rate, 3),
             "service_rate_min": round(svc_rate, 3),
             "service_time_sec": round(float(avg_service_time_sec), 2),
@@ -1,71 +1,220 @@
-from typing import List, Tuple, Dict
+from collections import deque
+from typing import Deque, List, Optional, Tuple, Dict
+import time
+
+
+Point = Tuple[int, int]
+
+
+class Track:
+    """
+    Compact per-track state (``__slots__``, no per-track dict).
+    Trajectory is a fixed-size ring buffer so memory per track is bounded.
+    """
+    __slots__ = (
+        'track_id', 'centroid', 'miss', 'first_seen', 'last_seen',
+        'entered_ts', '_history', '_head', '_size',
+    )
+
+    def __init__(self, track_id: int, history_len: int) -> None:
+        self.track_id = track_id
+        self._history: List[Optional[Point]] = [None] * max(1, history_len)
+        self.reset((0, 0), 0.0)
+
+    def reset(self, centroid: Point, now: float) -> None:
+        self.centroid = centroid
+        self.miss = 0
+        self.first_seen = now
+        self.last_seen = now
+        self.entered_ts: Optional[float] = None
+        self._head = 0
+        self._size = 0
+        self._push(centroid)
+
+    def observe(self, centroid: Point, now: float) -> None:
+        self.centroid = centroid
+        self.miss = 0
+        self.last_seen = now
+        self._push(centroid)
+
+    def _push(self, centroid: Point) -> None:
+        hist = self._history
+        hist[self._head] = centroid
+        self._head = (self._head + 1) % len(hist)
+        if self._size < len(hist):
+            self._size += 1
+
+    def trajectory(self) -> List[Point]:
+        """Centroids from oldest to newest (at most history_len)."""
+        hist = self._history
+        n = len(hist)
+        start = (self._head - self._size) % n
+        return [hist[(start + i) % n] for i in range(self._size)]  # type: ignore[misc]
+
+    def age(self) -> float:
+        return self.last_seen - self.first_seen
 
 
 class SimpleTracker:
     """
     Minimal centroid tracker with greedy one-to-one matching.
-    Keeps only last centroid and a small miss TTL per track.
+    Tracks live in a pool of reusable slots: ids are slot numbers and freed
+    slots are recycled oldest-first, so memory stays flat over long uptimes.
+    Tracks marked as entered (crossed the counting line) yield a dwell time
+    when they expire; collect them with pop_completed_dwells(). An entered
+    track that expires is parked for ``reentry_sec``: a new track appearing
+    within ``reentry_radius_px`` of its last centroid resumes the wait, so a
+    detection dropout longer than ``ttl`` does not cut the dwell short.
     """
-    def __init__(self, match_radius_px: int = 60, ttl: int = 6) -> None:
+    def __init__(self, match_radius_px: int = 60, ttl: int = 6, history_len: int = 32,
+                 max_completed: int = 256, reentry_sec: float = 5.0,
+                 reentry_radius_px: float = 120.0) -> None:
         self.match_radius_px = match_radius_px
         self.ttl = ttl
-        self._next_id = 1
-        # tracks: id -> { 'centroid': (x,y), 'miss': int }
-        self.tracks: Dict[int, Dict] = {}
+        self.history_len = max(1, int(history_len))
+        self.reentry_sec = reentry_sec
+        self.reentry_radius_px = reentry_radius_px
+        # tracks com espera aberta que expiraram: (last_seen, entered_ts, centróide)
+        self._parked: Deque[Tuple[float, float, Point]] = deque()
+        # pool de slots: id = índice + 1; slots livres são reutilizados por ordem FIFO
+        self._slots: List[Track] = []
+        self._free: Deque[int] = deque()
+        # tracks ativos: id -> Track
+        self.tracks: Dict[int, Track] = {}
+        self._completed_dwells: Deque[float] = deque(maxlen=max(1, int(max_completed)))
+        # tracks vistos no update anterior e falhados no último (id, último centróide)
+        self.last_lost: List[Tuple[int, Point]] = []
+
+    @property
+    def capacity(self) -> int:
+        """Number of allocated slots (peak of simultaneous tracks)."""
+        return len(self._slots)
+
+    def _acquire(self, centroid: Point, now: float) -> Track:
+        if self._free:
+            track = self._slots[self._free.popleft()]
+        else:
+            track = Track(len(self._slots) + 1, self.history_len)
+            self._slots.append(track)
+        track.reset(centroid, now)
+        self.tracks[track.track_id] = track
+        return track
+
+    def _release(self, track: Track) -> None:
+        if track.entered_ts is not None:
+            if self.reentry_sec > 0:
+                # pode ser só uma falha de deteção: a espera fecha em _flush_parked()
+                self._parked.append((track.last_seen, track.entered_ts, track.centroid))
+            else:
+                self._completed_dwells.append(max(0.0, track.last_seen - track.entered_ts))
+            track.entered_ts = None
+        del self.tracks[track.track_id]
+        self._free.append(track.track_id - 1)
+
+    def mark_entered(self, track_id: int, ts: Optional[float] = None) -> None:
+        """Marca o início da espera (track cruzou a linha de entrada)."""
+        track = self.tracks.get(track_id)
+        if track is not None and track.entered_ts is None:
+            track.entered_ts = track.last_seen if ts is None else ts
 
-    def update(self, centroids: List[Tuple[int, int]]) -> List[Tuple[int, Tuple[int, int], Tuple[int, int]]]:
+    def _flush_parked(self, now: float) -> None:
+        """Fecha as esperas dos tracks que não reapareceram dentro de reentry_sec."""
+        parked = self._parked
+        while parked and now - parked[0][0] > self.reentry_sec:
+            last_seen, entered_ts, _ = parked.popleft()
+            self._completed_dwells.append(max(0.0, last_seen - entered_ts))
+
+    def _resume(self, track: Track) -> None:
+        """Novo track junto a um track expirado com espera aberta: continua essa espera."""
+        cx, cy = track.centroid
+        max_d2 = self.reentry_radius_px * self.reentry_radius_px
+        best = None
+        for i, (_, _, (px, py)) in enumerate(self._parked):
+            d2 = (cx - px) * (cx - px) + (cy - py) * (cy - py)
+            if d2 <= max_d2 and (best is None or d2 < best[0]):
+                best = (d2, i)
+        if best is not None:
+            track.entered_ts = self._parked[best[1]][1]
+            del self._parked[best[1]]
+
+    def pop_completed_dwells(self) -> List[float]:
+        """Dwell times (seconds) of entered tracks that expired since the last call."""
+        if not self._completed_dwells:
+            return []
+        out = list(self._completed_dwells)
+        self._completed_dwells.clear()
+        return out
+
+    def trajectory(self, track_id: int) -> List[Point]:
+        track = self.tracks.get(track_id)
+        return track.trajectory() if track is not None else []
+
+    def update(self, centroids: List[Point], now: Optional[float] = None) -> List[Tuple[int, Point, Point]]:
         """
         Update tracker with current centroids.
         Returns list of matched (track_id, prev_centroid, curr_centroid).
         """
-        matched: List[Tuple[int, Tuple[int, int], Tuple[int, int]]] = []
+        matched: List[Tuple[int, Point, Point]] = []
+        self.last_lost = []
 
+        if self._parked:
+            if now is None:
+                now = time.time()
+            self._flush_parked(now)
         if not self.tracks and not centroids:
             return matched
+        if now is None:
+            now = time.time()
 
-        # Build candidate pairs (track_id, idx, d2) within radius
+        # Build candidate pairs (d2, track, idx) within radius
         pairs = []
         max_d2 = self.match_radius_px * self.match_radius_px
-        for tid, t in self.tracks.items():
-            px, py = t['centroid']
+        for t in self.tracks.values():
+            px, py = t.centroid
             for i, (cx, cy) in enumerate(centroids):
                 dx, dy = cx - px, cy - py
                 d2 = dx * dx + dy * dy
                 if d2 <= max_d2:
-                    pairs.append((d2, tid, i))
+                    pairs.append((d2, t, i))
 
         # Greedy one-to-one assign by nearest distance first
         pairs.sort(key=lambda x: x[0])
         used_tracks = set()
         used_indices = set()
-        for _, tid, idx in pairs:
+        for _, t, idx in pairs:
+            tid = t.track_id
             if tid in used_tracks or idx in used_indices:
                 continue
-            prev_c = self.tracks[tid]['centroid']
+            prev_c = t.centroid
             curr_c = centroids[idx]
             matched.append((tid, prev_c, curr_c))
-            self.tracks[tid]['centroid'] = curr_c
-            self.tracks[tid]['miss'] = 0
+            t.observe(curr_c, now)
             used_tracks.add(tid)
             used_indices.add(idx)
 
         # Create new tracks for unmatched centroids
+        created = set()
+        resume = bool(self._parked)
         for i, c in enumerate(centroids):
             if i in used_indices:
                 continue
-            tid = self._next_id
-            self._next_id += 1
-            self.tracks[tid] = {'centroid': c, 'miss': 0}
+            track = self._acquire(c, now)
+            created.add(track.track_id)
+            if resume:
+                self._resume(track)
 
-        # Age and remove missed tracks
-        to_delete = []
+        # Age and remove missed tracks (slots freed here are only reused
+        # from the next update on)
+        to_release = []
         for tid, t in self.tracks.items():
             if tid in used_tracks:
                 continue
-            t['miss'] += 1
-            if t['miss'] > self.ttl:
-                to_delete.append(tid)
-        for tid in to_delete:
-            del self.tracks[tid]
+            if t.miss == 0 and tid not in created:
+                self.last_lost.append((tid, t.centroid))
+            t.miss += 1
+            if t.miss > self.ttl:
+                to_release.append(t)
+        for t in to_release:
+            self._release(t)
 
         return matched
@@ -1,5 +1,10 @@
 import cv2
-from typing import List, Dict, Any
+import numpy as np
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+
+
+Rect = Tuple[int, int, int, int]  # x1, y1, x2, y2
 
 
 def detect_people(model, frame, conf: float) -> List[Dict[str, Any]]:
@@ -26,6 +31,176 @@ def detect_people(model, frame, conf: float) -> List[Dict[str, Any]]:
     return detections
 
 
+@dataclass
+class TilingConfig:
+    enabled: bool = False
+    tile_size: int = 640           # lado do tile em pixels do frame original
+    overlap: float = 0.2           # fração de sobreposição entre tiles vizinhos
+    region: str = 'full'           # 'full' = frame inteiro | 'band' = só banda de contagem
+    active_tiles: List[int] = field(default_factory=list)  # índices ativos; vazio = todos
+    full_frame_pass: bool = True   # juntar o frame inteiro ao batch (pessoas grandes/próximas)
+    nms_iou: float = 0.5           # IoU para suprimir duplicados entre tiles
+    merge_ios: float = 0.8         # interseção/área menor para juntar pessoas cortadas no limite
+
+
+def _axis_starts(length: int, tile: int, stride: int) -> List[int]:
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)  # último tile encostado à borda
+    return starts
+
+
+def compute_tiles(width: int, height: int, tile_size: int, overlap: float,
+                  region: Optional[Rect] = None) -> List[Rect]:
+    """Grelha (linha a linha) de tiles sobrepostos que cobre `region`."""
+    x0, y0, x1, y1 = region if region is not None else (0, 0, width, height)
+    x0, y0 = max(0, x0), max(0, y0)
+    x1, y1 = min(width, x1), min(height, y1)
+    tile = max(32, int(tile_size))
+    stride = max(1, int(tile * (1.0 - min(0.9, max(0.0, overlap)))))
+    tiles = []
+    for ty in _axis_starts(y1 - y0, tile, stride):
+        for tx in _axis_starts(x1 - x0, tile, stride):
+            tiles.append((x0 + tx, y0 + ty, min(x1, x0 + tx + tile), min(y1, y0 + ty + tile)))
+    return tiles
+
+
+def merge_detections(boxes: np.ndarray, scores: np.ndarray, iou_thr: float, ios_thr: float,
+                     sources: Optional[np.ndarray] = None,
+                     cut: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Greedy cross-tile NMS with box merging. Boxes with IoU above iou_thr
+    against the best remaining box are suppressed (plain NMS). A box that
+    comes from a different tile (``sources``) than the best box, where either
+    box touches an inner tile border (``cut``), is instead folded into it when
+    their intersection over the smaller area exceeds ios_thr (a person cut at
+    the border): the kept box grows to their union and keeps the best score.
+    Without ``sources``/``cut`` this is plain IoU NMS, so people occluding
+    each other inside one tile are never merged.
+    Returns (boxes, scores) of the merged detections, highest score first.
+    """
+    if len(boxes) == 0:
+        return boxes.reshape(0, 4), scores
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.maximum(0.0, x2 - x1) * np.maximum(0.0, y2 - y1)
+    can_merge = sources is not None and cut is not None and bool(cut.any())
+    order = np.argsort(-scores)
+    out_boxes = []
+    out_scores = []
+    while order.size > 0:
+        i = int(order[0])
+        rest = order[1:]
+        iw = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        ih = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = iw * ih
+        iou = inter / np.maximum(1e-6, areas[i] + areas[rest] - inter)
+        same = iou > iou_thr
+        box = boxes[i]
+        if can_merge:
+            ios = inter / np.maximum(1e-6, np.minimum(areas[i], areas[rest]))
+            # só entre tiles diferentes e com uma das caixas cortada numa fronteira interna
+            pieces = (sources[rest] != sources[i]) & (cut[i] | cut[rest]) & (ios > ios_thr)
+            if pieces.any():
+                same |= pieces
+                group = boxes[np.concatenate(([i], rest[pieces]))]
+                box = [group[:, 0].min(), group[:, 1].min(), group[:, 2].max(), group[:, 3].max()]
+        out_boxes.append(box)
+        out_scores.append(scores[i])
+        order = rest[~same]
+    return np.asarray(out_boxes, dtype=np.float32), np.asarray(out_scores, dtype=np.float32)
+
+
+def touches_inner_border(xyxy: np.ndarray, tile: Rect, outer: Rect, margin: float = 2.0) -> np.ndarray:
+    """Caixas (coordenadas do frame) encostadas a um lado do tile que não é borda da região."""
+    touch = np.zeros(len(xyxy), dtype=bool)
+    for axis, (lo, hi), (outer_lo, outer_hi) in (
+        (0, (tile[0], tile[2]), (outer[0], outer[2])),
+        (1, (tile[1], tile[3]), (outer[1], outer[3])),
+    ):
+        if lo > outer_lo:
+            touch |= xyxy[:, axis] <= lo + margin
+        if hi < outer_hi:
+            touch |= xyxy[:, axis + 2] >= hi - margin
+    return touch
+
+
+class TiledDetector:
+    """
+    Runs YOLO on overlapping tiles of the frame (or of the counting band) in a
+    single batch and merges the per-tile boxes into one detection list.
+    """
+
+    def __init__(self, cfg: TilingConfig):
+        self.cfg = cfg
+        self._tiles_cache: Dict[Tuple[int, int, Optional[Rect]], List[Rect]] = {}
+
+    def tiles_for(self, width: int, height: int, region: Optional[Rect] = None) -> List[Rect]:
+        key = (width, height, region)
+        tiles = self._tiles_cache.get(key)
+        if tiles is None:
+            tiles = compute_tiles(width, height, self.cfg.tile_size, self.cfg.overlap, region)
+            if self.cfg.active_tiles:
+                active = set(self.cfg.active_tiles)
+                tiles = [t for i, t in enumerate(tiles) if i in active]
+            self._tiles_cache[key] = tiles
+        return tiles
+
+    def detect(self, model, frame, conf: float, region: Optional[Rect] = None) -> List[Dict[str, Any]]:
+        H, W = frame.shape[:2]
+        tiles = self.tiles_for(W, H, region)
+        crops = [frame[y1:y2, x1:x2] for (x1, y1, x2, y2) in tiles]
+        sources: List[Optional[Rect]] = list(tiles)
+        if self.cfg.full_frame_pass:
+            crops.append(frame)
+            sources.append(None)  # frame inteiro: sem fronteiras internas
+        # extensão coberta pelos tiles: lados de tile aqui não cortam ninguém
+        outer = (min(t[0] for t in tiles), min(t[1] for t in tiles),
+                 max(t[2] for t in tiles), max(t[3] for t in tiles)) if tiles else (0, 0, W, H)
+
+        results = model(crops, conf=conf, classes=[0], verbose=False)
+
+        all_boxes = []
+        all_scores = []
+        all_sources = []
+        all_cut = []
+        for idx, (result, tile) in enumerate(zip(results, sources)):
+            boxes = result.boxes
+            if boxes is None or len(boxes) == 0:
+                continue
+            xyxy = boxes.xyxy.cpu().numpy().astype(np.float32)
+            if tile is not None:
+                xyxy[:, [0, 2]] += tile[0]
+                xyxy[:, [1, 3]] += tile[1]
+                all_cut.append(touches_inner_border(xyxy, tile, outer))
+            else:
+                all_cut.append(np.zeros(len(xyxy), dtype=bool))
+            all_boxes.append(xyxy)
+            all_scores.append(boxes.conf.cpu().numpy().astype(np.float32))
+            all_sources.append(np.full(len(xyxy), idx, dtype=np.int32))
+        if not all_boxes:
+            return []
+
+        merged, scores = merge_detections(
+            np.concatenate(all_boxes),
+            np.concatenate(all_scores),
+            self.cfg.nms_iou,
+            self.cfg.merge_ios,
+            sources=np.concatenate(all_sources),
+            cut=np.concatenate(all_cut),
+        )
+        return [
+            {
+                'x1': int(b[0]),
+                'y1': int(b[1]),
+                'x2': int(b[2]),
+                'y2': int(b[3]),
+                'confidence': float(s),
+            }
+            for b, s in zip(merged, scores)
+        ]
+
+
 def draw_detections(frame, detections):
     for det in detections:
         x1, y1 = det['x1'], det['y1']
@@ -0,0 +1,86 @@
+"""Band-region cascade: fast and accurate detections are merged without duplicates.
+
+Run from the project root: python -m pytest tests
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+from cascade import CascadeConfig, ModelCascade  # noqa: E402
+
+
+class _Tensor:
+    def __init__(self, values):
+        self._values = np.asarray(values, dtype=np.float32)
+
+    def __getitem__(self, i):
+        return _Tensor(self._values[i])
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._values
+
+    def __float__(self):
+        return float(self._values)
+
+
+class _Box:
+    def __init__(self, xyxy, conf):
+        self.xyxy = _Tensor([xyxy])
+        self.conf = _Tensor([conf])
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class _FakeModel:
+    """Devolve caixas fixas em coordenadas do frame recebido (o crop da banda)."""
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+    def __call__(self, frame, **kwargs):
+        return [_Result([_Box(b, c) for b, c in self.boxes])]
+
+
+BAND = (860, 0, 1060, 1080)
+FRAME = np.zeros((1080, 1920, 3), dtype=np.uint8)
+
+
+def _det(x1, y1, x2, y2, conf):
+    return {'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2, 'confidence': conf}
+
+
+def _escalated_cascade(accurate_boxes):
+    # crowd_people=1: qualquer pessoa na banda escala para o modelo preciso
+    cfg = CascadeConfig(enabled=True, region='band', crowd_people=1)
+    return ModelCascade(cfg, _FakeModel(accurate_boxes))
+
+
+def test_person_straddling_band_edge_is_counted_once():
+    # pessoa em x 780-900: centróide fora da banda, corte de 860 a 900 dentro dela
+    fast = [_det(780, 300, 900, 700, 0.8), _det(900, 300, 1000, 700, 0.9)]
+    accurate = [((0, 300, 40, 700), 0.7), ((40, 300, 140, 700), 0.95)]
+    cascade = _escalated_cascade(accurate)
+    out = cascade.detect(lambda frame, conf: fast, FRAME, 0.5, 0.0, BAND)
+    spans = sorted((d['x1'], d['x2']) for d in out)
+    assert spans == [(780, 900), (900, 1000)]
+
+
+def test_separate_people_outside_and_inside_band_are_kept():
+    fast = [_det(600, 300, 700, 700, 0.8), _det(900, 300, 1000, 700, 0.9)]
+    accurate = [((40, 300, 140, 700), 0.95)]
+    cascade = _escalated_cascade(accurate)
+    out = cascade.detect(lambda frame, conf: fast, FRAME, 0.5, 0.0, BAND)
+    assert sorted((d['x1'], d['x2']) for d in out) == [(600, 700), (900, 1000)]
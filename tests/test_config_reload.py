@@ -0,0 +1,101 @@
+"""Live-config parsing, restart-only detection and button listener restarts.
+
+Run from the project root: python -m pytest tests
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+from button_listener import ButtonListener, ButtonListenerConfig  # noqa: E402
+from config_reload import LIVE_SPEC, parse_live, restart_required  # noqa: E402
+
+
+def test_quoted_numbers_are_converted():
+    values, errors = parse_live({
+        'confidence_threshold': '0.4',
+        'tracking': {'match_radius_px': '80', 'ttl': 6.0},
+        'counting': {'line_color_bgr': [0, 255, 0], 'direction': 'right_to_left'},
+        'cascade': {'region': 'FULL'},
+        'button': {'trigger_key': 12},
+    })
+    assert errors == []
+    assert values[(None, 'confidence_threshold')] == 0.4
+    assert values[('tracking', 'match_radius_px')] == 80.0
+    assert isinstance(values[('tracking', 'match_radius_px')], float)
+    assert values[('tracking', 'ttl')] == 6 and isinstance(values[('tracking', 'ttl')], int)
+    assert values[('counting', 'line_color_bgr')] == (0, 255, 0)
+    assert values[('cascade', 'region')] == 'full'
+    assert values[('button', 'trigger_key')] == '1'
+
+
+def test_missing_keys_are_omitted():
+    values, errors = parse_live({'tracking': {'ttl': 3}})
+    assert errors == []
+    assert values == {('tracking', 'ttl'): 3}
+
+
+@pytest.mark.parametrize("cfg, key", [
+    ({'cascade': {'probe_confidence': 'abc'}}, 'cascade.probe_confidence'),
+    ({'cascade': {'low_conf_ratio': 1.5}}, 'cascade.low_conf_ratio'),
+    ({'confidence_threshold': 0}, 'confidence_threshold'),
+    ({'process_every_n_frames': 2.5}, 'process_every_n_frames'),
+    ({'tracking': {'ttl': True}}, 'tracking.ttl'),
+    ({'counting': {'direction': 'up'}}, 'counting.direction'),
+    ({'counting': {'line_color_bgr': [0, 300, 0]}}, 'counting.line_color_bgr'),
+    ({'emoncms': {'enabled': 'yes'}}, 'emoncms.enabled'),
+    ({'button': {'trigger_key': ' '}}, 'button.trigger_key'),
+    ({'yolo_model': ['a.pt']}, 'yolo_model'),
+    ({'queue': 5}, 'queue'),
+])
+def test_invalid_values_are_rejected(cfg, key):
+    values, errors = parse_live(cfg)
+    assert len(errors) == 1
+    assert errors[0].startswith(key + ":")
+
+
+def test_non_mapping_file_is_rejected():
+    assert parse_live(None)[1] == ["o ficheiro não contém um mapa YAML"]
+    assert parse_live(['a'])[1]
+
+
+def test_restart_required_lists_only_restart_keys():
+    old = {'video_source': 0, 'confidence_threshold': 0.5,
+           'tiling': {'enabled': False}, 'tracking': {'ttl': 6, 'history_len': 32}}
+    new = {'video_source': 1, 'confidence_threshold': 0.3,
+           'tiling': {'enabled': True}, 'tracking': {'ttl': 3, 'history_len': 64}}
+    assert restart_required(old, new) == ['tiling', 'tracking.history_len', 'video_source']
+
+
+def test_restart_required_for_sections_without_live_object():
+    old = {'cascade': {'hold_sec': 3}}
+    new = {'cascade': {'hold_sec': 5}}
+    assert restart_required(old, new) == []
+    live = [key for key in LIVE_SPEC if key[0] != 'cascade']
+    assert restart_required(old, new, live) == ['cascade']
+
+
+def test_button_restart_refuses_while_old_reader_is_alive():
+    listener = ButtonListener(ButtonListenerConfig(enabled=False), on_key=lambda key: None)
+    release = threading.Event()
+    stuck = threading.Thread(target=release.wait, daemon=True)  # leitura presa na porta
+    stuck.start()
+    listener._thread = stuck
+    old_stop = listener._stop
+    try:
+        with pytest.raises(RuntimeError):
+            listener.restart()
+        assert listener._thread is stuck
+        assert listener._stop is old_stop and old_stop.is_set()
+    finally:
+        release.set()
+        stuck.join()
+    listener.restart()  # leitura antiga terminou: reabre normalmente
+    assert listener._thread is None
@@ -0,0 +1,105 @@
+"""Aggregator counters under packet loss, duplicates, restarts and bad datagrams.
+
+Run from the project root: python -m pytest tests
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+from federation import PROTOCOL_VERSION, FederationAggregator, FederationConfig  # noqa: E402
+
+
+def _msg(seq, entries, services, boot=1, node="caixa-1", queue_len=0, **extra):
+    msg = {"v": PROTOCOL_VERSION, "n": node, "b": boot, "s": seq, "t": 0.0,
+           "e": entries, "sv": services, "q": queue_len, "ar": 1.0, "st": 20.0}
+    msg.update(extra)
+    return json.dumps(msg).encode("utf-8")
+
+
+@pytest.fixture
+def agg():
+    return FederationAggregator(FederationConfig(node_timeout_sec=10.0))
+
+
+def test_lost_packet_does_not_undercount(agg):
+    assert agg.handle_message(_msg(1, 2, 1), 0.0)
+    # seq 2 (e=5, sv=2) perdido
+    assert agg.handle_message(_msg(3, 6, 3), 1.0)
+    state = agg.site_state(1.0)
+    assert state["entries"] == 6
+    assert state["services"] == 3
+    assert state["packets_lost"] == 1
+
+
+def test_duplicate_and_late_packets_are_ignored(agg):
+    assert agg.handle_message(_msg(1, 1, 0), 0.0)
+    assert agg.handle_message(_msg(3, 4, 1), 1.0)
+    assert not agg.handle_message(_msg(3, 4, 1), 1.1)
+    assert not agg.handle_message(_msg(2, 3, 0), 1.2)
+    assert agg.site_state(1.2)["entries"] == 4
+
+
+def test_restart_keeps_totals_from_previous_boot(agg):
+    agg.handle_message(_msg(1, 10, 7, boot=1), 0.0)
+    # reinício: contadores e sequência do nó recomeçam
+    assert agg.handle_message(_msg(1, 2, 1, boot=2), 5.0)
+    assert agg.handle_message(_msg(2, 3, 2, boot=2), 6.0)
+    state = agg.site_state(6.0)
+    assert state["entries"] == 13
+    assert state["services"] == 9
+    # pacote atrasado do arranque anterior não volta a mudar o estado
+    assert not agg.handle_message(_msg(2, 11, 7, boot=1), 6.5)
+    assert agg.site_state(6.5)["entries"] == 13
+
+
+def test_restart_with_first_packet_lost(agg):
+    agg.handle_message(_msg(1, 4, 2, boot=1), 0.0)
+    # seq 1 do novo arranque perdido: o total recebido já inclui essas entradas
+    assert agg.handle_message(_msg(2, 3, 1, boot=2), 5.0)
+    state = agg.site_state(5.0)
+    assert state["entries"] == 7
+    assert state["services"] == 3
+
+
+def test_site_state_sums_nodes(agg):
+    agg.handle_message(_msg(1, 3, 1, node="caixa-1", queue_len=2), 0.0)
+    agg.handle_message(_msg(1, 5, 2, node="caixa-2", queue_len=4), 0.0)
+    state = agg.site_state(1.0)
+    assert state["nodes_online"] == 2
+    assert state["queue_len"] == 6
+    assert state["entries"] == 8
+    # duas caixas a 20 s por atendimento em paralelo
+    assert state["eta_sec"] == 60
+    assert agg.site_state(20.0)["nodes_online"] == 0
+
+
+@pytest.mark.parametrize("data", [
+    b"[1, 2]",
+    b"not json",
+    b"\xff\xfe",
+    b"null",
+    json.dumps({"v": PROTOCOL_VERSION, "n": "x", "s": 1, "e": "abc"}).encode(),
+    json.dumps({"v": PROTOCOL_VERSION, "n": "x", "s": 1, "q": [1]}).encode(),
+    json.dumps({"v": PROTOCOL_VERSION, "n": "x", "s": None}).encode(),
+    json.dumps({"v": PROTOCOL_VERSION, "n": "x"}).encode(),
+    json.dumps({"v": PROTOCOL_VERSION - 1, "n": "x", "s": 1}).encode(),
+])
+def test_malformed_datagrams_are_rejected(agg, data):
+    assert not agg.handle_message(data, 0.0)
+    assert agg.site_state(0.0)["nodes_total"] == 0
+
+
+def test_bad_value_does_not_half_apply(agg):
+    agg.handle_message(_msg(1, 2, 1, queue_len=3), 0.0)
+    assert not agg.handle_message(_msg(2, 5, 2, queue_len=1, st="slow"), 1.0)
+    state = agg.site_state(1.0)
+    assert state["entries"] == 2
+    assert state["queue_len"] == 3
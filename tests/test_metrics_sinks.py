@@ -0,0 +1,53 @@
+"""CSV file sink keeps every metric when new fields appear.
+
+Run from the project root: python -m pytest tests
+"""
+
+from __future__ import annotations
+
+import csv
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+from metrics_sinks import FileSink, MetricsSink, MetricsSnapshot, SinkConfig  # noqa: E402
+
+
+def _rows(path: Path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def test_metrics_sink_is_abstract():
+    with pytest.raises(TypeError):
+        MetricsSink(SinkConfig())
+
+
+def test_csv_starts_new_file_when_fields_appear(tmp_path):
+    sink = FileSink(tmp_path / "metrics.csv", SinkConfig(), fmt="csv")
+    sink.open()
+    sink.write_batch([MetricsSnapshot(1.0, {"queue_len": 2})])
+    sink.write_batch([MetricsSnapshot(2.0, {"queue_len": 3, "gate_skipped": 7})])
+    sink.write_batch([MetricsSnapshot(3.0, {"queue_len": 4})])
+    sink.close()
+
+    assert [r["queue_len"] for r in _rows(tmp_path / "metrics.csv")] == ["2"]
+    rotated = sink.current_path
+    assert rotated != tmp_path / "metrics.csv"
+    rows = _rows(rotated)
+    assert [(r["queue_len"], r["gate_skipped"]) for r in rows] == [("3", "7"), ("4", "")]
+
+
+def test_csv_appends_with_existing_header(tmp_path):
+    path = tmp_path / "metrics.csv"
+    for ts in (1.0, 2.0):
+        sink = FileSink(path, SinkConfig(), fmt="csv")
+        sink.open()
+        sink.write_batch([MetricsSnapshot(ts, {"queue_len": 1, "entries": 5})])
+        sink.close()
+    assert sink.current_path == path
+    assert len(_rows(path)) == 2
@@ -0,0 +1,60 @@
+"""Service timing in button mode: idle periods must not count as service time.
+
+Run from the project root: python -m pytest tests
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+from eta_engine import EtaEngineConfig, MonteCarloEta  # noqa: E402
+from queue_metrics import QueueStats  # noqa: E402
+
+
+def _served_then_idle(idle_sec: float):
+    """Seis atendimentos de 20 s, fila vazia e depois idle_sec sem ninguém."""
+    qs = QueueStats(service_window=10,
+                    eta_engine=MonteCarloEta(EtaEngineConfig(enabled=True, seed=1)))
+    t = 0.0
+    for _ in range(6):
+        qs.on_entry(t)
+        t += 20.0
+        qs.register_service_event(t)
+    assert qs.current_queue_len() == 0
+    return qs, t + idle_sec
+
+
+def test_idle_period_is_not_elapsed_service_time():
+    qs, now = _served_then_idle(600.0)
+    qs.on_entry(now)
+    assert qs.in_service_elapsed(now, observed=True) == 0.0
+    assert qs.in_service_elapsed(now + 5.0, observed=True) == 5.0
+
+
+def test_eta_after_idle_matches_a_fresh_service():
+    qs, now = _served_then_idle(600.0)
+    qs.on_entry(now)
+    elapsed = qs.in_service_elapsed(now, observed=True)
+    eta = qs.eta_percentiles(1, qs.estimated_service_time(20.0), elapsed)
+    assert eta == {50: 20, 90: 20}
+
+
+def test_service_after_idle_records_duration_from_arrival():
+    qs, now = _served_then_idle(600.0)
+    qs.on_entry(now)
+    qs.register_service_event(now + 25.0)
+    assert qs._service_durations[-1] == 25.0
+    assert qs.estimated_service_time(20.0) < 25.0
+
+
+def test_back_to_back_services_measure_from_last_press():
+    qs, now = _served_then_idle(30.0)
+    qs.on_entry(now)
+    qs.on_entry(now + 1.0)    # já havia fila: o segundo começa no botão seguinte
+    qs.register_service_event(now + 20.0)
+    qs.register_service_event(now + 38.0)
+    assert list(qs._service_durations)[-2:] == [20.0, 18.0]
@@ -0,0 +1,75 @@
+"""Tracker: lost-track reporting and dwell times across detection dropouts.
+
+Run from the project root: python -m pytest tests
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+from tracker import SimpleTracker  # noqa: E402
+
+
+def test_never_matched_track_is_not_reported_lost():
+    tracker = SimpleTracker(match_radius_px=30, ttl=2)
+    tracker.update([(100, 100)], 0.0)     # deteção isolada: track novo, nunca associado
+    assert tracker.last_lost == []
+    for i in range(1, 5):                 # falha até expirar
+        tracker.update([], float(i))
+        assert tracker.last_lost == []
+    assert tracker.tracks == {}
+
+
+def test_matched_track_is_reported_lost_once():
+    tracker = SimpleTracker(match_radius_px=30, ttl=2)
+    tracker.update([(100, 100)], 0.0)
+    tracker.update([(105, 100)], 1.0)
+    tracker.update([], 2.0)
+    assert [tid for tid, _ in tracker.last_lost] == [1]
+    tracker.update([], 3.0)
+    assert tracker.last_lost == []
+
+
+def _entered_track(tracker: SimpleTracker) -> None:
+    tracker.update([(100, 100)], 0.0)
+    tracker.update([(102, 100)], 1.0)
+    tracker.mark_entered(1, 1.0)
+
+
+def test_dropout_longer_than_ttl_keeps_the_wait():
+    tracker = SimpleTracker(match_radius_px=30, ttl=2, reentry_sec=5.0, reentry_radius_px=60)
+    _entered_track(tracker)
+    for t in (2.0, 3.0, 4.0):             # 3 falhas > ttl: o track expira
+        tracker.update([], t)
+    assert tracker.tracks == {}
+    assert tracker.pop_completed_dwells() == []
+    tracker.update([(130, 100)], 5.0)     # volta perto do último ponto
+    tracker.update([(132, 100)], 20.0)
+    for t in (21.0, 22.0, 23.0, 40.0):
+        tracker.update([], t)
+    assert tracker.pop_completed_dwells() == [19.0]
+
+
+def test_wait_closes_when_track_does_not_come_back():
+    tracker = SimpleTracker(match_radius_px=30, ttl=2, reentry_sec=5.0, reentry_radius_px=60)
+    _entered_track(tracker)
+    for t in (2.0, 3.0, 4.0):
+        tracker.update([], t)
+    tracker.update([(400, 400)], 5.0)     # outra pessoa, longe: não herda a espera
+    assert [t.entered_ts for t in tracker.tracks.values()] == [None]
+    tracker.update([], 7.0)
+    assert tracker.pop_completed_dwells() == [0.0]
+
+
+def test_reentry_disabled_closes_wait_on_expiry():
+    tracker = SimpleTracker(match_radius_px=30, ttl=2, reentry_sec=0.0)
+    tracker.update([(100, 100)], 0.0)
+    tracker.update([(102, 100)], 4.0)
+    tracker.mark_entered(1, 1.0)
+    for t in (5.0, 6.0, 7.0):
+        tracker.update([], t)
+    assert tracker.pop_completed_dwells() == [3.0]
@@ -0,0 +1,83 @@
+"""Cross-tile merging: only people cut at an inner tile border are folded together.
+
+Run from the project root: python -m pytest tests
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+from vision import TiledDetector, TilingConfig, merge_detections  # noqa: E402
+
+# pessoa alta e outra parcialmente tapada por ela: IoU baixo, IoS = 1
+OCCLUDED = np.array([[100, 100, 200, 400], [150, 150, 200, 300]], dtype=np.float32)
+SCORES = np.array([0.9, 0.8], dtype=np.float32)
+
+
+def test_overlapping_uncut_boxes_are_not_merged():
+    boxes, _ = merge_detections(OCCLUDED, SCORES, 0.5, 0.8,
+                                sources=np.array([0, 1]), cut=np.array([False, False]))
+    assert len(boxes) == 2
+
+
+def test_overlapping_boxes_from_same_tile_are_not_merged():
+    boxes, _ = merge_detections(OCCLUDED, SCORES, 0.5, 0.8,
+                                sources=np.array([0, 0]), cut=np.array([True, True]))
+    assert len(boxes) == 2
+
+
+def test_without_tile_information_is_plain_nms():
+    boxes, scores = merge_detections(OCCLUDED, SCORES, 0.5, 0.8)
+    assert len(boxes) == 2
+    dup = np.array([[100, 100, 200, 400], [102, 100, 202, 400]], dtype=np.float32)
+    boxes, scores = merge_detections(dup, SCORES, 0.5, 0.8)
+    assert boxes.tolist() == [[100, 100, 200, 400]]
+    assert scores.tolist() == [SCORES[0]]
+
+
+class _Tensor:
+    def __init__(self, values):
+        self._values = np.asarray(values, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._values
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf):
+        self.xyxy = _Tensor(xyxy)
+        self.conf = _Tensor(conf)
+
+    def __len__(self):
+        return len(self.conf.numpy())
+
+
+class _Result:
+    def __init__(self, xyxy, conf):
+        self.boxes = _Boxes(xyxy, conf)
+
+
+def test_person_split_across_inner_border_is_merged():
+    detector = TiledDetector(TilingConfig(enabled=True, tile_size=640, overlap=0.2,
+                                          full_frame_pass=False))
+    frame = np.zeros((640, 1152, 3), dtype=np.uint8)
+    assert detector.tiles_for(1152, 640) == [(0, 0, 640, 640), (512, 0, 1152, 640)]
+
+    def model(crops, **kwargs):
+        # pessoa em x 560-760: o tile 0 só vê 560-640 (cortada na fronteira interna);
+        # o tile 1 (a partir de x=512) vê-a inteira, coordenadas locais 48-248
+        return [_Result([[560, 100, 640, 400]], [0.7]),
+                _Result([[48, 100, 248, 400]], [0.85])]
+
+    dets = detector.detect(model, frame, 0.5)
+    assert [(d['x1'], d['y1'], d['x2'], d['y2']) for d in dets] == [(560, 100, 760, 400)]
+    assert dets[0]['confidence'] == np.float32(0.85)